@@ -0,0 +1,449 @@
+# Benchmarks for the frac data type, run head to head against fractions.Fraction
+#
+# Run with:
+#   python benchmarks.py [--filter TEXT] [--repeat N] [--json PATH]
+#       Runs every benchmark (or the ones whose name contains TEXT), prints a table and
+#       optionally writes the results to PATH as JSON
+#   python benchmarks.py compare OLD.json NEW.json [--threshold 0.1]
+#       Compares two JSON result files and lists the benchmarks where frac got slower
+#       (or bigger) by more than the threshold. Exits with status 1 if there are any
+#
+# Every result is a cost, in microseconds per operation, seconds per workload or bytes
+# per instance, so lower is always better
+
+from frac import *
+from concurrent.futures import ThreadPoolExecutor
+from fractions import Fraction
+import argparse
+import datetime
+import fraclinalg
+import itertools
+import json
+import platform
+import random
+import sys
+import timeit
+import tracemalloc
+
+
+# Registry of benchmarks: (name, unit, make)
+# make(cls) is called with frac and with Fraction. For timings, it returns (run, count)
+# where run() performs 'count' operations. For memory, it returns the measurement
+# It returns None if cls has nothing equivalent to compare
+BENCHMARKS = []
+
+def benchmark(name, unit='us'):
+    def register(make):
+        BENCHMARKS.append((name, unit, make))
+        return make
+    return register
+
+
+def _batch(function, inputs):
+    def run():
+        for x in inputs:
+            function(x)
+    return run, len(inputs)
+
+def _batch2(function, pairs):
+    def run():
+        for x, y in pairs:
+            function(x, y)
+    return run, len(pairs)
+
+
+# Construction, for every type of input accepted by frac()
+# The inputs are all different, so that frac's instance space doesn't just return
+# a previously created instance
+
+_N = 5000
+
+@benchmark('construct/int')
+def _(cls):
+    return _batch(cls, range(10**6, 10**6 + _N))
+
+@benchmark('construct/int pair')
+def _(cls):
+    return _batch2(cls, [(i, 7) for i in range(10**6, 10**6 + _N)])
+
+@benchmark('construct/float')
+def _(cls):
+    return _batch(cls, [i + 0.25 for i in range(_N)])
+
+@benchmark('construct/str n/d')
+def _(cls):
+    return _batch(cls, [f'{i}/7' for i in range(1, _N + 1)])
+
+@benchmark('construct/str decimal')
+def _(cls):
+    return _batch(cls, [f'{i}.25' for i in range(_N)])
+
+@benchmark('construct/str repeating')
+def _(cls):
+    if cls is Fraction:
+        return None
+    return _batch(cls, [f'{i}.3...' for i in range(_N)])
+
+@benchmark('construct/str mixed repeating')
+def _(cls):
+    if cls is Fraction:
+        return None
+    return _batch(cls, [f'{i}.1_6...' for i in range(_N)])
+
+@benchmark('construct/copy')
+def _(cls):
+    return _batch(cls, [cls(i, 7) for i in range(1, _N + 1)])
+
+
+# Arithmetic and comparisons, on pairs of fractions with moderately sized terms
+
+def _operands(cls):
+    return [(cls(355*i + 1, 113*i + 2), cls(-22*i - 1, 7*i + 3)) for i in range(1, _N + 1)]
+
+for _name, _function in (('add', lambda x, y: x + y), ('sub', lambda x, y: x - y),
+                         ('mul', lambda x, y: x * y), ('truediv', lambda x, y: x / y),
+                         ('pow', lambda x, y: x ** 3), ('neg', lambda x, y: -x),
+                         ('eq', lambda x, y: x == y), ('ne', lambda x, y: x != y),
+                         ('lt', lambda x, y: x < y), ('le', lambda x, y: x <= y),
+                         ('gt', lambda x, y: x > y), ('ge', lambda x, y: x >= y),
+                         ('add int', lambda x, y: x + 3), ('mul int', lambda x, y: x * 3)):
+    benchmark('arithmetic/' + _name)(lambda cls, function=_function: _batch2(function, _operands(cls)))
+
+
+# Sorting, where every comparison needs the exact product of two big integers unless
+# cheaper tests can order the fractions first
+@benchmark('sort/1000 bit terms', 's')
+def _(cls):
+    rng = random.Random(0)
+    values = [cls(rng.randint(-2**1000, 2**1000), rng.randint(1, 2**1000)) for _ in range(5000)]
+    return (lambda: sorted(values)), 1
+
+
+# The same operations, when their results aren't interned yet
+# Above, every run after the first one finds its results in frac's instance space. Here,
+# the instance space is emptied before every run, so every result is a new fraction (a
+# miss), which is the common case in real programs, where results are rarely computed twice
+
+def _missing(function, pairs):
+    def run():
+        frac.clear_instance_space()
+        for x, y in pairs:
+            function(x, y)
+    return run, len(pairs)
+
+for _name, _function in (('add', lambda x, y: x + y), ('sub', lambda x, y: x - y),
+                         ('mul', lambda x, y: x * y), ('truediv', lambda x, y: x / y),
+                         ('neg', lambda x, y: -x)):
+    benchmark('arithmetic miss/' + _name)(lambda cls, function=_function: _missing(function, _operands(cls)))
+
+
+# Conversions
+# frac caches these values, so the uncached methods are called directly
+
+@benchmark('convert/decimal')
+def _(cls):
+    if cls is Fraction:
+        return None
+    values = [frac(i, 100003) for i in range(1, 51)]       # 33334 repeating digits
+
+    def run():
+        saved = frac.max_repeating_digits
+        frac.max_repeating_digits = 10**5
+        try:
+            for x in values:
+                x._decimal_repr()
+        finally:
+            frac.max_repeating_digits = saved
+    return run, len(values)
+
+@benchmark('convert/float')
+def _(cls):
+    values = [cls(i, 100003) for i in range(1, _N + 1)]
+    if cls is frac:
+        return _batch(frac._float_repr, values)
+    return _batch(float, values)
+
+@benchmark('convert/float large terms')
+def _(cls):
+    values = [cls(3**200 + i, 7**150 + 2*i) for i in range(_N)]
+    if cls is frac:
+        return _batch(frac._float_repr, values)
+    return _batch(float, values)
+
+# Formatting to 6 decimal places. The denominators are large primes, so the decimal
+# expansions have very long periods, which .decimal would have to compute in full
+@benchmark('convert/format .6f')
+def _(cls):
+    if cls is Fraction:
+        return None
+    values = [frac(i, 1000003) for i in range(1, _N + 1)]
+    return _batch(lambda x: format(x, '.6f'), values)
+
+@benchmark('convert/format many .6f')
+def _(cls):
+    if cls is Fraction:
+        return None
+    values = [frac(i, 1000003) for i in range(1, _N + 1)]
+    return (lambda: frac.format_many(values, '.6f')), len(values)
+
+
+# The summations from examples.py, with + in a loop and with the bulk methods
+
+@benchmark('examples/pi', 's')
+def _(cls):
+    def run():
+        my_pi = 0
+        for i in range(10000):
+            my_pi += cls((-1)**i, 2*i+1)
+        return 4*my_pi
+    return run, 1
+
+@benchmark('examples/pi series', 's')
+def _(cls):
+    if cls is Fraction:
+        return None
+    return (lambda: 4*frac.series(lambda i: ((-1)**i, 2*i+1), 0, 10000)), 1
+
+@benchmark('examples/pi accumulator', 's')
+def _(cls):
+    if cls is Fraction:
+        return None
+
+    def run():
+        acc = fracaccumulator()
+        for i in range(10000):
+            acc += frac((-1)**i, 2*i+1)
+        return 4*acc.freeze()
+    return run, 1
+
+@benchmark('examples/geometric', 's')
+def _(cls):
+    def run():
+        current_sum = 0
+        for i in range(1, 1001):
+            current_sum += cls(1, 2**i)
+        return current_sum
+    return run, 1
+
+@benchmark('examples/geometric sum', 's')
+def _(cls):
+    if cls is Fraction:
+        return None
+    return (lambda: frac.sum(frac(1, 2**i) for i in range(1, 1001))), 1
+
+
+@benchmark('examples/parallel sum', 's')
+def _(cls):
+    if cls is Fraction:
+        return None
+    terms = [frac((-1)**i, 2*i+1) for i in range(100000)]
+    return (lambda: frac.parallel_sum(terms)), 1
+
+
+# Exact linear algebra on a 200 by 200 matrix of small fractions
+
+def _matrix(n):
+    return [[frac((i*j*7919 + i + 3*j) % 201 - 100, (i + 2*j) % 10 + 1) for j in range(n)] for i in range(n)]
+
+@benchmark('linalg/det 200', 's')
+def _(cls):
+    if cls is Fraction:
+        return None
+    a = _matrix(200)
+    return (lambda: fraclinalg.det(a)), 1
+
+@benchmark('linalg/solve 200', 's')
+def _(cls):
+    if cls is Fraction:
+        return None
+    a = _matrix(200)
+    b = [frac(i % 7 - 3) for i in range(200)]
+    return (lambda: fraclinalg.solve(a, b)), 1
+
+
+# Construction from several threads at once
+# Also checks that every thread got the right numerator and denominator, and that
+# all threads share the same interned instances
+
+def stress_threads(threads=8, rounds=20, size=2000):
+    def work(seed):
+        built = []
+        for r in range(rounds):
+            for i in range(1, size):
+                x = frac(seed*i + r, i)
+                built.append(((seed*i + r, i), x))
+        return built
+
+    with ThreadPoolExecutor(threads) as pool:
+        results = list(pool.map(work, range(1, threads + 1)))
+
+    for built in results:
+        for (a, b), x in built:
+            if x.numerator * b != a * x.denominator:
+                raise AssertionError(f"{a}/{b} was built as {x}")
+            if x is not frac(a, b):
+                raise AssertionError(f"{a}/{b} isn't interned")
+    return threads * rounds * (size - 1)
+
+# Fractions built per thread count, with the same total amount of work. The cost per
+# fraction shows how construction scales (or doesn't) as threads are added
+# With several threads, stress_threads first checks that the fractions they build are
+# right and interned
+
+def _threaded(threads, total=16000):
+    if threads > 1:
+        stress_threads(threads)
+    offsets = itertools.count()
+    size = total // threads
+
+    def work(offset):
+        for i in range(1, size + 1):
+            frac(i + size*offset, i + 7)
+
+    def run():
+        with ThreadPoolExecutor(threads) as pool:
+            list(pool.map(work, [next(offsets) for _ in range(threads)]))
+    return run, threads * size
+
+for _threads in (1, 2, 4, 8):
+    benchmark(f'threads/construct x{_threads}')(lambda cls, threads=_threads: None if cls is Fraction else _threaded(threads))
+
+
+# Memory used per instance, including frac's instance space entry
+# For comparison, the 'layout' benchmarks measure the instances on their own: with the
+# layout frac had before __slots__ (a __dict__ holding the numerator, the denominator and
+# five cache attributes), and with the current slotted layout and its on-demand cache
+
+class _dict_layout:
+    def __init__(self, a, b):
+        self._numerator = a
+        self._denominator = b
+        self._int = None
+        self._decimal = None
+        self._float = None
+        self._repr = None
+        self._str = None
+
+def _slotted_layout(a, b):
+    x = object.__new__(frac)
+    x._numerator = a
+    x._denominator = b
+    x._cache = None
+    return x
+
+def _allocated(build, count=20000):
+    numerators = [10**12 + i for i in range(count)]         # Keeps the ints themselves out of the measurement
+    frac.clear_instance_space()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = [build(numerators[i], 7) for i in range(count)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    frac.clear_instance_space()
+    return (after - before) / count
+
+@benchmark('memory/instance', 'bytes')
+def _(cls):
+    return _allocated(cls)
+
+@benchmark('memory/dict layout', 'bytes')
+def _(cls):
+    return None if cls is Fraction else _allocated(_dict_layout)
+
+@benchmark('memory/slotted layout', 'bytes')
+def _(cls):
+    return None if cls is Fraction else _allocated(_slotted_layout)
+
+
+# Running and comparing
+
+def _measure(unit, made, repeat):
+    if unit == 'bytes':
+        return made
+    run, count = made
+    best = min(timeit.repeat(run, number=1, repeat=repeat))
+    return best / count * (1e6 if unit == 'us' else 1)
+
+def run_benchmarks(name_filter='', repeat=3):
+    results = {}
+    for name, unit, make in BENCHMARKS:
+        if name_filter not in name:
+            continue
+        entry = {'unit': unit}
+        for label, cls in (('frac', frac), ('Fraction', Fraction)):
+            made = make(cls)
+            if made is not None:
+                entry[label] = _measure(unit, made, repeat)
+        results[name] = entry
+        _print_result(name, entry)
+    return results
+
+def _print_result(name, entry):
+    line = f"{name:<32}"
+    for label in ('frac', 'Fraction'):
+        if label in entry:
+            line += f"{label} {entry[label]:>12.4f} {entry['unit']:<6}"
+        else:
+            line += " " * (len(label) + 20)
+    if entry.get('Fraction'):
+        line += f"x{entry['frac'] / entry['Fraction']:.2f}"
+    print(line, flush=True)
+
+def write_json(path, results):
+    document = {'python': platform.python_version(),
+                'platform': platform.platform(),
+                'date': datetime.datetime.now().isoformat(timespec='seconds'),
+                'results': results}
+    with open(path, 'w') as file:
+        json.dump(document, file, indent=2)
+
+# Prints frac's results from two JSON files side by side, and returns the
+# (name, old, new, change) of every benchmark where frac's cost grew by more
+# than 'threshold' (relative to the old cost)
+def compare(old_path, new_path, threshold=0.1):
+    with open(old_path) as file:
+        old = json.load(file)['results']
+    with open(new_path) as file:
+        new = json.load(file)['results']
+    regressions = []
+    for name in old:
+        if name not in new:
+            continue
+        before = old[name].get('frac')
+        after = new[name].get('frac')
+        if before and after is not None:
+            change = after / before - 1
+            print(f"{name:<32}{before:>12.4f} -> {after:>12.4f} {new[name]['unit']:<6}{change:+.1%}")
+            if change > threshold:
+                regressions.append((name, before, after, change))
+    return regressions
+
+
+def main(argv):
+    if argv[:1] == ['compare']:
+        parser = argparse.ArgumentParser(prog='benchmarks.py compare')
+        parser.add_argument('old')
+        parser.add_argument('new')
+        parser.add_argument('--threshold', type=float, default=0.1, help="relative slowdown to flag (default 0.1)")
+        args = parser.parse_args(argv[1:])
+        regressions = compare(args.old, args.new, args.threshold)
+        print()
+        for name, before, after, change in regressions:
+            print(f"REGRESSION {name}: {change:+.1%}")
+        print(f"{len(regressions)} regression(s)")
+        return 1 if regressions else 0
+
+    parser = argparse.ArgumentParser(prog='benchmarks.py')
+    parser.add_argument('--filter', default='', help="only run the benchmarks whose name contains this")
+    parser.add_argument('--repeat', type=int, default=3, help="timing repetitions, the best one is kept")
+    parser.add_argument('--json', help="write the results to this file")
+    args = parser.parse_args(argv)
+    results = run_benchmarks(args.filter, args.repeat)
+    if args.json:
+        write_json(args.json, results)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
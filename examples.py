@@ -32,11 +32,11 @@ clear()
 print("> Pi summation\n")
 
 print("Processing...")              # It usually takes a few seconds
-my_pi = 0
+acc = fracaccumulator()
 for i in range(10000):
-    my_pi += frac((-1)**i, 2*i+1)
+    acc += frac((-1)**i, 2*i+1)
 
-my_pi *= 4
+my_pi = 4*acc.freeze()
 
 print("Decimal representation:", my_pi.decimal)
 print()
@@ -1,12 +1,626 @@
 # A class to implement fractions
 
+import collections
+import concurrent.futures
+import contextlib
+import contextvars
+import decimal
+import functools
+import itertools
 import math
+import numbers
+import os
+import random
 import re
+import struct
+import sys
+import threading
+import time
+import warnings
+import weakref
 
 # Custom exception class
 class FractionError(Exception):
     pass
 
+# Custom warning class, for results that had to be cut short
+# (Ex: decimal expansions with more than frac.max_repeating_digits repeating digits)
+# Silence with warnings.simplefilter('ignore', FractionWarning), or send to the
+# logging module with logging.captureWarnings(True)
+class FractionWarning(UserWarning):
+    pass
+
+_HASH_MODULUS = sys.hash_info.modulus
+_HASH_INF = sys.hash_info.inf
+
+# Number theory helpers, used to find the length of the repeating part of decimal expansions
+
+_small_primes = [p for p in range(2, 1000) if all(p % q for q in range(2, int(p**0.5) + 1))]
+
+# Miller-Rabin test. Deterministic for n < 3.3 * 10**24, and a strong
+# probable-prime test with 12 bases beyond that
+def _is_prime(n):
+    if n < 2:
+        return False
+    for p in _small_primes[:12]:
+        if n % p == 0:
+            return n == p
+    d = n - 1
+    s = 0
+    while d % 2 == 0:
+        d //= 2
+        s += 1
+    for a in _small_primes[:12]:
+        x = pow(a, d, n)
+        if x == 1 or x == n - 1:
+            continue
+        for _ in range(s - 1):
+            x = x * x % n
+            if x == n - 1:
+                break
+        else:
+            return False
+    return True
+
+# Pollard's rho (Brent's variant). Returns a non-trivial factor of the composite n
+# It draws its random starting points from its own generator, so that it neither
+# depends on nor disturbs the state of the global random module
+_random = random.Random()
+
+def _pollard_rho(n):
+    if n % 2 == 0:
+        return 2
+    while True:
+        y, c, m = _random.randrange(1, n), _random.randrange(1, n), 128
+        g = r = q = 1
+        while g == 1:
+            x = y
+            for _ in range(r):
+                y = (y*y + c) % n
+            k = 0
+            while k < r and g == 1:
+                ys = y
+                for _ in range(min(m, r - k)):
+                    y = (y*y + c) % n
+                    q = q * abs(x - y) % n
+                g = math.gcd(q, n)
+                k += m
+            r *= 2
+        if g == n:              # Backtrack one step at a time
+            g = 1
+            while g == 1:
+                ys = (ys*ys + c) % n
+                g = math.gcd(abs(x - ys), n)
+        if g != n:
+            return g
+
+# Product tree of the primes below 2**16: level 0 is the list of primes and
+# each level above holds the products of pairs of entries from the level below
+@functools.lru_cache(maxsize=None)
+def _prime_product_tree():
+    sieve = bytearray([1]) * 2**16
+    sieve[0] = sieve[1] = 0
+    for p in range(2, 2**8):
+        if sieve[p]:
+            sieve[p*p::p] = bytearray(len(range(p*p, 2**16, p)))
+    levels = [[p for p in range(2**16) if sieve[p]]]
+    while len(levels[-1]) > 1:
+        below = levels[-1]
+        levels.append([math.prod(below[i:i+2]) for i in range(0, len(below), 2)])
+    return levels
+
+# Returns the primes below 2**16 that divide n
+# Goes down the product tree, only visiting the nodes that share a factor with n,
+# which is much faster than trial division when n is large
+def _small_prime_divisors(n):
+    levels = _prime_product_tree()
+    found = []
+    stack = [(len(levels) - 1, 0, math.gcd(n, levels[-1][0]))]
+    while stack:
+        level, index, g = stack.pop()
+        if g == 1:
+            continue
+        if level == 0:
+            found.append(levels[0][index])
+            continue
+        below = levels[level - 1]
+        for child in (2*index, 2*index + 1):
+            if child < len(below):
+                stack.append((level - 1, child, math.gcd(g, below[child])))
+    return found
+
+# Returns the prime factorization of n as a dictionary {prime: exponent}
+# Small prime factors are removed first, so that the (slow, for large n) primality
+# tests and Pollard's rho only ever see what's left
+def _factorize(n):
+    factors = {}
+    for p in _small_primes:
+        if p * p > n:
+            break
+        while n % p == 0:
+            n //= p
+            factors[p] = factors.get(p, 0) + 1
+    if n > 2**20:
+        for p in _small_prime_divisors(n):
+            while n % p == 0:
+                n //= p
+                factors[p] = factors.get(p, 0) + 1
+    stack = [n] if n > 1 else []
+    while stack:
+        m = stack.pop()
+        if _is_prime(m):
+            factors[m] = factors.get(m, 0) + 1
+        else:
+            d = _pollard_rho(m)
+            stack += [d, m // d]
+    return factors
+
+# Smallest m > 0 such that a**m % n == 1, for a co-prime to n
+# The order modulo each prime power p**k of n is found by starting from the order
+# of the group, p-1, and dividing out its prime factors while a**(order/q) is still 1.
+# The order modulo p**k is then the order modulo p times some power of p, and the
+# order modulo n is the lcm of the orders modulo its prime powers
+def _multiplicative_order(a, n):
+    order = 1
+    for p, k in _factorize(n).items():
+        t = p - 1
+        for q in _factorize(t):
+            while t % q == 0 and pow(a, t // q, p) == 1:
+                t //= q
+        pk = p**k
+        while pow(a, t, pk) != 1:
+            t *= p
+        order = order * t // math.gcd(order, t)
+    return order
+
+# Integer k-th root: the largest r such that r**k <= x, for x >= 0
+# Newton's method, starting from a power of two above the root, decreases
+# monotonically to it
+def _iroot(x, k):
+    if x < 2 or k == 1:
+        return x
+    if k == 2:
+        return math.isqrt(x)
+    if k >= x.bit_length():
+        return 1
+    r = 1 << -(-x.bit_length() // k)
+    while True:
+        s = ((k - 1)*r + x // r**(k - 1)) // k
+        if s >= r:
+            return r
+        r = s
+
+# The max_denominator of the innermost frac.bounded block, in the current thread or task
+_max_denominator = contextvars.ContextVar('max_denominator', default=None)
+
+# Unsigned LEB128 varints: 7 bits per byte, least significant group first, with the high
+# bit set on every byte but the last
+# Large values are converted 7 bytes (8 groups) at a time, through int.to_bytes and
+# int.from_bytes, so that the cost stays linear in their size
+def _write_varint(value, out):
+    if value >> 56:
+        raw = value.to_bytes(-(-value.bit_length() // 56) * 7, 'little')
+        for i in range(0, len(raw) - 7, 7):
+            group = int.from_bytes(raw[i:i + 7], 'little')
+            for _ in range(8):
+                out.append(group & 0x7f | 0x80)
+                group >>= 7
+        value = int.from_bytes(raw[-7:], 'little')
+    while value >= 0x80:
+        out.append(value & 0x7f | 0x80)
+        value >>= 7
+    out.append(value)
+
+# Returns the value of the varint starting at data[pos], and the position after it
+# Varints of more than 8 bytes are found with a regular expression and converted
+# through a string of their bits, as int(string, 2) takes linear time
+_VARINT_END = re.compile(rb'[\x80-\xff]*[\x00-\x7f]')
+_VARINT_BITS = [format(byte & 0x7f, '07b') for byte in range(256)]
+
+def _read_varint(data, pos):
+    start = pos
+    value = shift = 0
+    try:
+        while shift < 56:
+            byte = data[pos]
+            pos += 1
+            value |= (byte & 0x7f) << shift
+            if byte < 0x80:
+                return value, pos
+            shift += 7
+    except IndexError:
+        raise FractionError("Truncated fraction data") from None
+    match = _VARINT_END.match(data, start)
+    if match is None:
+        raise FractionError("Truncated fraction data")
+    end = match.end()
+    return int(''.join(map(_VARINT_BITS.__getitem__, reversed(data[start:end]))), 2), end
+
+# Denominators from which frac's comparisons try cheaper tests before the exact one
+# (see frac._compare). Measured on sorts, the tests start paying off at about 400 bits
+_COMPARE_LIMIT = 1 << 384
+
+# Format specs, as in format(x, spec) and f-strings, with the same syntax as for floats:
+#   [[fill]align][sign][z][#][0][width][grouping][.precision][type]
+# The types are e, E, f, F, g, G and %. Without a type (and without a precision) the
+# fraction is formatted as 'n/d', so format(x, '') == str(x)
+_FORMAT_SPEC = re.compile(r'''
+    (?:(?P<fill>.)?(?P<align>[<>=^]))?
+    (?P<sign>[-+ ]?)
+    (?P<no_negative_zero>z)?
+    (?P<alternate>\#)?
+    (?P<zeropad>0(?=\d))?
+    (?P<width>\d+)?
+    (?P<grouping>[,_])?
+    (?:\.(?P<precision>\d+))?
+    (?P<type>[eEfFgG%])?
+''', re.DOTALL | re.VERBOSE)
+
+# Rounds n/d (d > 0) to a multiple of 10**exponent, half to even, and returns the
+# multiple as an int
+# This is a single integer division, whatever the length of the period of n/d, so only
+# the digits asked for are ever computed
+def _round_scaled(n, d, exponent):
+    if exponent >= 0:
+        d *= 10**exponent
+    else:
+        n *= 10**-exponent
+    q, r = divmod(n, d)
+    if 2*r > d or (2*r == d and q & 1):
+        q += 1
+    return q
+
+# Rounds n/d (n, d > 0) to 'figures' significant digits, and returns (digits, exponent)
+# where digits*10**exponent is the rounded value and digits has exactly 'figures' digits
+# The first exponent tried comes from the bit lengths, and is at most one or two off
+def _round_figures(n, d, figures):
+    low = 10**(figures - 1)
+    high = 10*low
+    exponent = (n.bit_length() - d.bit_length()) * 30103 // 100000 - figures + 1
+    while True:
+        digits = _round_scaled(n, d, exponent)
+        if digits >= high:
+            exponent += 1
+        elif digits < low:
+            exponent -= 1
+        else:
+            return digits, exponent
+
+# Returns a function format_pair(n, d) that formats the fraction n/d (d > 0) as the
+# format spec says. The spec is only parsed once, and the functions are cached
+@functools.lru_cache(maxsize=256)
+def _formatter(spec):
+    match = _FORMAT_SPEC.fullmatch(spec)
+    kind = match and match['type']
+    precision = match and match['precision']
+    if match is None or (kind is None and precision is None and (match['no_negative_zero'] or match['alternate']
+                                                                 or match['zeropad'] or match['grouping'])):
+        raise ValueError(f"Invalid format specifier '{spec}' for object of type 'frac'")
+    fill = match['fill'] or ' '
+    align = match['align']
+    # The 0 flag pads with zeros after the sign. With an explicit alignment, it only sets
+    # the fill character, if there isn't one
+    # Like for floats, zeros after the sign (from the flag or from '0=') get separators too
+    if match['zeropad'] is not None:
+        if match['fill'] is None:
+            fill = '0'
+        align = align or '='
+    align = align or '>'
+    zeropad = fill == '0' and align == '='
+    width = int(match['width'] or 0)
+    positive = match['sign'] if match['sign'] in '+ ' else ''
+    grouping = match['grouping']
+    alternate = match['alternate'] is not None
+    no_negative_zero = match['no_negative_zero'] is not None
+
+    def pad(sign, body):
+        padding = width - len(sign) - len(body)
+        if padding <= 0:
+            return sign + body
+        if align == '<':
+            return sign + body + fill*padding
+        if align == '>':
+            return fill*padding + sign + body
+        if align == '=':
+            return sign + fill*padding + body
+        return fill*(padding // 2) + sign + body + fill*(padding - padding // 2)
+
+    if kind is None and precision is None:
+        def format_pair(n, d):
+            return pad('-' if n < 0 else positive, f"{abs(n)}/{d}")
+        return format_pair
+
+    # Without a type, a precision gives 'g', except that fixed-point is used for one
+    # exponent less and always shows a digit after the point, like for floats
+    general = kind is None
+    kind = kind or 'g'
+    precision = 6 if precision is None else int(precision)
+    if kind in 'gG':
+        precision = max(precision, 1)
+    exponent_char = 'E' if kind in 'EG' else 'e'
+
+    def format_pair(n, d):
+        negative = n < 0
+        n = abs(n)
+        suffix = ''
+        if kind in 'fF%':
+            if kind == '%':
+                n *= 100
+                suffix = '%'
+            places = precision
+            digits = _round_scaled(n, d, -places)
+        else:
+            figures = precision + 1 if kind in 'eE' else precision
+            if n:
+                digits, exponent = _round_figures(n, d, figures)
+            else:
+                digits, exponent = 0, 1 - figures
+            leading_exponent = exponent + figures - 1
+            if kind in 'gG' and -4 <= leading_exponent < precision - general:
+                places = -exponent
+            else:
+                places = figures - 1
+                suffix = f"{exponent_char}{leading_exponent:+03d}"
+        if digits == 0 and no_negative_zero:
+            negative = False
+        text = str(digits).zfill(places + 1)
+        leading = text[:len(text) - places]
+        fraction = text[len(text) - places:]
+        if kind in 'gG' and not alternate:
+            fraction = fraction.rstrip('0')
+            if general and not suffix:
+                fraction = fraction or '0'
+        trailing = ('.' + fraction if fraction or alternate else '') + suffix
+        sign = '-' if negative else positive
+        if zeropad:
+            # The separators are added to the zeros too, hence the smaller count of zeros
+            zeros = width - len(sign) - len(trailing)
+            leading = leading.zfill(3*zeros // 4 + 1 if grouping else zeros)
+        if grouping:
+            first = 1 + (len(leading) - 1) % 3
+            leading = leading[:first] + ''.join(grouping + leading[i:i + 3] for i in range(first, len(leading), 3))
+        return pad(sign, leading + trailing)
+    return format_pair
+
+# Unreduced sums and products of (numerator, denominator) pairs, and the value of an
+# empty sum and product, for frac._tree_reduce
+# These are module level functions (rather than lambdas) so that they can be sent to
+# the worker processes of frac.parallel_sum and frac.parallel_prod
+def _add_unreduced(n1, d1, n2, d2):
+    return n1*d2 + n2*d1, d1*d2
+
+def _mul_unreduced(n1, d1, n2, d2):
+    return n1*n2, d1*d2
+
+_REDUCTIONS = {'sum': (_add_unreduced, (0, 1)), 'prod': (_mul_unreduced, (1, 1))}
+
+# Reduces a list of pairs to a single reduced pair. Runs in the worker processes
+def _reduce_chunk(kind, pairs, normalize_bits):
+    merge, empty = _REDUCTIONS[kind]
+    return frac._tree_reduce(pairs, merge, normalize_bits, empty)
+
+# Interning table for frac objects
+# weak    : if True, the table only holds weak references, so a fraction that
+#           isn't referenced anywhere else is dropped from the table automatically
+# maxsize : the number of most recently used fractions that are kept alive by the
+#           table itself. With weak=False this is a hard cap on the size of the
+#           table, and with weak=True it's the number of fractions that stay interned
+#           even after the rest of the program stops using them
+#           None means no limit (with weak=False, this is a plain dictionary
+#           that keeps every fraction ever created alive)
+# hits, misses and evictions count lookups that found an existing instance,
+# lookups that didn't, and entries dropped to respect maxsize
+#
+# Every new fraction goes through here, so a miss costs one lookup and one insert, and
+# neither takes a lock: the insert is a dict.setdefault, which is atomic, so two threads
+# creating the same fraction at once still end up with one instance
+# Weak tables are plain dictionaries of weak references, without callbacks. A dead entry
+# counts as a miss, and is replaced by the next fraction with the same key. The dead
+# entries are swept out whenever the table has doubled in size since the last sweep, so
+# that the cost of the sweeps is spread over the inserts (WeakValueDictionary deletes
+# each entry from a callback instead, with a lot more Python code on every access)
+# The strong references of a weak table are kept in two generations of maxsize entries,
+# rather than in an exact LRU order: fractions are added to the young generation, which
+# becomes the old one once it's full, when the previous old one is dropped. A hit on a
+# fraction that's already in the young generation costs nothing more, and at least the
+# maxsize most recently used fractions (at most twice as many) are kept alive
+# The counters aren't protected by a lock, so they're approximate when many threads
+# use the table at once
+_SWEEP_SIZE = 4096              # Smallest size of a weak table at which dead entries are swept out
+
+class _InstanceSpace:
+    def __init__(self, maxsize=None, weak=False):
+        if maxsize is not None and maxsize < 0:
+            raise FractionError("maxsize must be a non-negative integer or None")
+        self.maxsize = maxsize
+        self.weak = weak
+        if weak:
+            self._table = {}
+            self._young = {} if maxsize else None      # None: nothing is kept alive
+            self._old = {}
+            self._sweep_size = _SWEEP_SIZE
+        else:
+            self._table = {} if maxsize is None else collections.OrderedDict()
+            self._young = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # Returns the instance stored for key, or None
+    def get(self, key):
+        value = self._table.get(key)
+        if value is not None and self.weak:
+            value = value()
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        if self._young is not None:
+            if key not in self._young:
+                self._remember(key, value)
+        elif self.maxsize is not None and not self.weak:
+            try:
+                self._table.move_to_end(key)
+            except KeyError:            # Evicted by another thread in the meantime
+                pass
+        return value
+
+    # Stores value for key, unless another thread got there first
+    # Returns the instance that ends up in the table
+    def add(self, key, value):
+        if self.weak:
+            ref = weakref.ref(value)
+            existing = self._table.setdefault(key, ref)
+            if existing is not ref:
+                existing = existing()
+                if existing is not None:
+                    return existing
+                self._table[key] = ref      # Replaces a dead entry
+            elif len(self._table) > self._sweep_size:
+                self._sweep()
+            young = self._young
+            if young is not None:
+                young[key] = value          # Like _remember, inlined
+                if len(young) >= self.maxsize:
+                    self._rotate()
+            return value
+        existing = self._table.setdefault(key, value)
+        if existing is not value:
+            return existing
+        if self.maxsize is not None:
+            try:
+                while len(self._table) > self.maxsize:
+                    self._table.popitem(last=False)
+                    self.evictions += 1
+            except KeyError:            # Another thread evicted the same entries
+                pass
+        return value
+
+    # Deletes the dead entries of a weak table
+    # The entry is only deleted if it still holds the dead weakref, as another thread may
+    # have given the key to a new fraction in the meantime
+    def _sweep(self):
+        table = self._table
+        for key, ref in list(table.items()):
+            if ref() is None and table.get(key) is ref:
+                try:
+                    del table[key]
+                except KeyError:
+                    pass
+        self._sweep_size = max(2*len(table), _SWEEP_SIZE)
+
+    # Keeps a strong reference to a recently used instance, in the young generation
+    def _remember(self, key, value):
+        young = self._young
+        young[key] = value
+        if len(young) >= self.maxsize:
+            self._rotate()
+
+    # The young generation becomes the old one, and the old one is dropped
+    def _rotate(self):
+        self.evictions += len(self._old)
+        self._old = self._young
+        self._young = {}
+
+    def _items(self):
+        if not self.weak:
+            return list(self._table.items())
+        items = [(key, ref()) for key, ref in list(self._table.items())]
+        return [(key, value) for key, value in items if value is not None]
+
+    def clear(self):
+        self._table.clear()
+        if self._young is not None:
+            self._young = {}
+            self._old = {}
+
+    def stats(self):
+        return {'size': len(self), 'maxsize': self.maxsize, 'weak': self.weak,
+                'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+
+    def __contains__(self, key):
+        value = self._table.get(key)
+        if value is not None and self.weak:
+            value = value()
+        return value is not None
+
+    def __len__(self):
+        if self.weak:
+            return len(self._items())
+        return len(self._table)
+
+    def __iter__(self):
+        return iter([key for key, value in self._items()])
+
+    def __repr__(self):
+        return repr(dict(self._items()))
+
+# Opt-in instrumentation, see frac.enable_metrics
+# While metrics are enabled, the methods named in _INSTRUMENTED are replaced on the
+# class by wrappers that count the calls, record the bit lengths of their frac
+# operands, and pass the time each call takes to the timing hook, if there is one
+# Nothing is wrapped while metrics are disabled, so they cost nothing then
+class _Metrics:
+    def __init__(self, timing_hook=None):
+        self.timing_hook = timing_hook
+        self.calls = collections.Counter()
+        self.bit_lengths = collections.defaultdict(collections.Counter)
+        self.truncations = 0
+        self.originals = {}
+
+    # Returns a wrapper around function, recording its calls under 'name'
+    # bit_lengths[name][k] counts the calls whose largest frac operand (numerator or
+    # denominator of the first two arguments) had less than k bits, and at least k/2
+    def wrap(self, name, function):
+        calls = self.calls
+        bit_lengths = self.bit_lengths[name]
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            calls[name] += 1
+            bits = 0
+            for x in args[:2]:
+                if isinstance(x, frac):
+                    bits = max(bits, x._numerator.bit_length(), x._denominator.bit_length())
+            if bits:
+                bit_lengths[1 << bits.bit_length()] += 1
+            hook = self.timing_hook
+            if hook is None:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                hook(name, time.perf_counter() - start)
+        return wrapper
+
+    # Replaces the methods of cls with their wrappers
+    def install(self, cls):
+        for name in _INSTRUMENTED:
+            original = cls.__dict__[name]
+            self.originals[name] = original
+            if isinstance(original, (staticmethod, classmethod)):
+                wrapped = type(original)(self.wrap(name, original.__func__))
+            else:
+                wrapped = self.wrap(name, original)
+            setattr(cls, name, wrapped)
+
+    def uninstall(self, cls):
+        for name, original in self.originals.items():
+            setattr(cls, name, original)
+        self.originals.clear()
+
+    def snapshot(self):
+        return {'calls': dict(self.calls),
+                'bit_lengths': {name: dict(sorted(counts.items())) for name, counts in self.bit_lengths.items() if counts},
+                'truncations': self.truncations}
+
+_INSTRUMENTED = ('from_reduced', '_parse_pair', '_decimal_helper', '_bounded_period', '_decimal_repr', '_float_repr',
+                 'sum', 'prod', 'series', 'parse_many', 'parse_buffer',
+                 '__add__', '__radd__', '__sub__', '__rsub__', '__mul__', '__rmul__',
+                 '__truediv__', '__rtruediv__', '__neg__', '__pow__', '__rpow__',
+                 '__eq__', '__ne__', '__lt__', '__le__', '__gt__', '__ge__')
+
 class frac:
     '''Fractions
 
@@ -16,6 +630,7 @@ Constructor:
     frac(float a)        -->       fractional representation of 'a' (Ex: 2.2 -> 22 by 10)
     frac(string a)       -->       fractional representation of 'a' (Ex: '2/3' -> 2 by 3, '0.3...' -> 1 by 3, '0.1_6...' -> 1 by 6)
     frac(frac a)         -->       a.numerator by a.denominator
+    frac(Fraction a)     -->       a.numerator by a.denominator (for fractions.Fraction, or any numbers.Rational)
 
     If two arguments are passed, say a and b, then the resulting fraction is equivalent to frac(a) by frac(b)
 
@@ -34,24 +649,38 @@ Constructor:
             frac('0.6...', '1.0')
             frac('-0.6...', '1/-1')'''
 
+    # Only the numerator and denominator are stored inline. The values of int(),
+    # float(), str(), repr() and .decimal are evaluated during the first call to
+    # them and are then stored in _cache to make subsequent calls faster
+    # Fractions are meant to be immutable, so they never need to be re-evaluated
+    # _cache is None until one of them is needed, as most fractions (intermediate
+    # results, for example) never use any of them
+    __slots__ = ('_numerator', '_denominator', '_cache', '__weakref__')
+
     # Note : _instance_space might cause problems with inheritence
-    # Stores all current instances
-    _instance_space = {}
-    _latest_a = 0
-    _latest_b = 0
+    # Stores the current instances (see _InstanceSpace and configure_instance_space)
+    # By default, fractions are interned as long as they're alive, and the 1024 most
+    # recently used ones are kept alive by the table itself
+    _instance_space = _InstanceSpace(maxsize=1024, weak=True)
 
-    # Regular expressions for string input during initialization
+    # Regular expression for string input during initialization
     # Type 1 : num/num         -->   1/2, -20/300, 40/-50, -20/-3
     # Type 2 : num.num         -->   4, -5, 4.25, -3.2, 4.0
     # Type 3 : num.num...      -->   4.34..., -0.3...
     # Type 4 : num.num_num...  -->   4.3_4..., -0.1_6...
-    _t1 = re.compile(r'-{0,1}\d+/-{0,1}\d+')
-    _t2_1 = re.compile(r'-{0,1}\d+')              # No decimal point
-    _t2_2 = re.compile(r'-{0,1}\d+\.\d+')         # With a decimal point
-    _t3 = re.compile(r'-{0,1}\d+\.\d+\.{3}')
-    _t4 = re.compile(r'-{0,1}\d+\.\d+_\d+\.{3}')
+    # All four types are matched by one expression, in a single pass. The groups
+    # that take part in the match tell which type the string is
+    _format = (r'(?P<sign>-?)(?P<int>\d+)'
+               r'(?:/(?P<den>-?\d+)'                                  # Type 1
+               r'|\.(?P<dec>\d+)(?:(?P<all>\.{3})|_(?P<rep>\d+)\.{3})?)?')   # Types 2, 3 and 4
+    _string_format = re.compile(_format)
+    _bytes_format = re.compile(_format.encode())
 
     max_repeating_digits = 2000             # Max repeating digits allowed
+    decimal_executor = None                 # Executor for the searches of decimal_async (None for the event loop's default)
+    parallel_min_size = 10000               # Smallest input spread over processes by parallel_sum and parallel_prod
+
+    _metrics = None                         # A _Metrics object while metrics are enabled
 
     # Empties _instance_space
     # This does NOT remove the instances from
@@ -65,18 +694,114 @@ Constructor:
     def clear_instance_space(cls):
         cls._instance_space.clear()
 
+    # Replaces _instance_space with a new, empty table
+    # Ex: frac.configure_instance_space(maxsize=None, weak=False) restores the old
+    # behaviour of keeping every fraction ever created
+    @classmethod
+    def configure_instance_space(cls, maxsize=1024, weak=True):
+        cls._instance_space = _InstanceSpace(maxsize, weak)
+
+    # Returns a dictionary with the size, settings and hit/miss/eviction counters of _instance_space
+    @classmethod
+    def instance_space_stats(cls):
+        return cls._instance_space.stats()
+
+    # Metrics, for finding out where the time goes in a program using fractions
+    # enable_metrics(timing_hook)  -->  starts counting (again, from zero if metrics were
+    #                                   already enabled). If timing_hook is given, it's called
+    #                                   as timing_hook(name, seconds) after every instrumented call
+    # disable_metrics()            -->  stops counting, and removes all overhead
+    # metrics()                    -->  a dictionary with
+    #     'calls'          : number of calls of each operator and internal hot path
+    #                        (from_reduced is called once for every fraction created)
+    #     'bit_lengths'    : for each of them, a histogram of the bit lengths of their operands.
+    #                        {64: 10} means 10 calls with operands of 32 to 63 bits
+    #     'truncations'    : number of decimal expansions cut at max_repeating_digits
+    #     'instance_space' : frac.instance_space_stats()
+    #     'period_cache'   : hits and misses of the caches of repeating digit counts
+    # Ex: frac.enable_metrics(lambda name, seconds: histogram[name].observe(seconds))
+    @classmethod
+    def enable_metrics(cls, timing_hook=None):
+        cls.disable_metrics()
+        cls._metrics = _Metrics(timing_hook)
+        cls._metrics.install(cls)
+
+    @classmethod
+    def disable_metrics(cls):
+        if cls._metrics is not None:
+            cls._metrics.uninstall(cls)
+            cls._metrics = None
+
+    # Changes the timing hook without resetting the counters
+    @classmethod
+    def set_timing_hook(cls, timing_hook):
+        if cls._metrics is None:
+            raise FractionError("Metrics aren't enabled, use frac.enable_metrics()")
+        cls._metrics.timing_hook = timing_hook
+
+    @classmethod
+    def metrics(cls):
+        if cls._metrics is None:
+            raise FractionError("Metrics aren't enabled, use frac.enable_metrics()")
+        result = cls._metrics.snapshot()
+        result['instance_space'] = cls.instance_space_stats()
+        infos = [cls._metrics.originals[name].__func__.cache_info() for name in ('_decimal_helper', '_bounded_period')]
+        result['period_cache'] = {'hits': sum(info.hits for info in infos), 'misses': sum(info.misses for info in infos),
+                                  'size': sum(info.currsize for info in infos)}
+        return result
+
+    # Returns the numerator and denominator (not reduced) represented by a string
+    # (or bytes) in one of the four formats above, or None if it isn't in any of them
     @staticmethod
-    def _expression_match(string, expr):         # Returns if the string in it's entirety matches expr
-        for match in expr.finditer(string):
-            if match[0] == string:
-                return True
-        return False
+    def _parse_pair(string, format=_string_format):
+        match = format.fullmatch(string)
+        if match is None:
+            return None
+        sign, pre_decimal, den, post_decimal, all_repeating, repeating = match.groups()
+        a = int(pre_decimal)
+        if den is not None:                     # Type 1
+            b = int(den)
+        elif post_decimal is None:              # Type 2, no decimal point
+            b = 1
+        elif all_repeating:                     # Type 3
+            b = 10**len(post_decimal) - 1
+            a = a*b + int(post_decimal)
+        elif repeating is not None:             # Type 4
+            l1 = len(post_decimal)
+            cycle = 10**len(repeating) - 1
+            b = 10**l1 * cycle
+            a = a*b + int(post_decimal)*cycle + int(repeating)
+        else:                                   # Type 2, with a decimal point
+            b = 10**len(post_decimal)
+            a = a*b + int(post_decimal)
+        if sign:
+            a = -a
+        return a, b
 
     # To obtain the number of repeating digits in 1/n, and the number of places before them
     # Ex: _decimal_helper(6) = (1, 1) as after 1 decimal place, 1 digit repeats infinitely in 0.1666...
     # Output format : Tuple -> (a, b) where after 'a' decimal places, 'b' digits repeat
+    # Results are cached by denominator, as fractions often share denominators
     @staticmethod
+    @functools.lru_cache(maxsize=4096)
     def _decimal_helper(n):
+        pre_repetition, n = frac._split_denominator(n)
+
+        # 'n' is not a multiple of 2 or 5 now
+        # For such an n != 1, the number of digits that repeat in it's decimal
+        # expansion is the smallest 'm' such that (10**m mod n) == 1, which is
+        # the multiplicative order of 10 modulo n
+        # For cases where the initial 'n' is of the form 2**p * 5**q for p, q >= 0,
+        # n is 1 now and there is no repetition. The decimal expansion is simply
+        # 'pre_repetition' number of digits, followed by infinite leading zeros
+        if n == 1:
+            return (pre_repetition, 0)
+        return (pre_repetition, _multiplicative_order(10, n))
+
+    # Returns (places, n without its factors of 2 and 5), where 'places' is the number of
+    # decimal places before the repetition begins in 1/n
+    @staticmethod
+    def _split_denominator(n):
         counter_two = 0         # Number of two's in the prime-factorization of n
         counter_five = 0        # Number of five's in the prime-factorization of n
         
@@ -91,73 +816,46 @@ Constructor:
         # multiply 1/n by 10 till the denominator isn't a multiple of
         # 2 or 5. This is the number of decimal places after which the
         # repetition begins, if it does.
-        pre_repetition = max(counter_two, counter_five)
+        return max(counter_two, counter_five), n
 
-        # 'n' is not a multiple of 2 or 5 now
-        # For such an n != 1, we can evaluate the number of digits that
-        # repeat in it's decimal expansion as follows :
-        # We take a number 'm' from 1 to n-1 and stop at the first value
-        # of 'm' such that (10**m mod n) == 1
-        for i in range(1, n):
-            if 10**i % n == 1:
-                return (pre_repetition, i)
-
-            # To prevent it from taking a long long time
-            if i == frac.max_repeating_digits:
-                print("Warning: Repeating digits truncated to", frac.max_repeating_digits)
-                print("Use frac.max_repeating_digits to change")
-                return (pre_repetition, frac.max_repeating_digits)
-        
-        # For cases where the initial 'n' is of the form 2**p * 5**q for p, q >= 0
-        # In which case, there is no repetition and the decimal expansion is simply
-        # 'pre_repetition' number of digits, followed by infinite leading zeroskjk
-        return (pre_repetition, 0)
+    # Like _decimal_helper, but the number of repeating digits is only found if it's at
+    # most 'limit'. Otherwise, limit + 1 is returned in its place
+    # The multiplicative order needs the factorization of n, which can take minutes when n
+    # has two large prime factors. Stepping through 10**m mod n up to 'limit' takes at most
+    # 'limit' modular multiplications, and is all that .decimal needs, as it cuts the
+    # repeating digits at frac.max_repeating_digits anyway
+    @staticmethod
+    @functools.lru_cache(maxsize=4096)
+    def _bounded_period(n, limit):
+        pre_repetition, n = frac._split_denominator(n)
+        if n == 1:
+            return (pre_repetition, 0)
+        r = 10 % n
+        for m in range(1, limit + 1):
+            if r == 1:
+                return (pre_repetition, m)
+            r = r * 10 % n
+        return (pre_repetition, limit + 1)
     
     # Creating a new instance or returning a pre-existing one from instance_space
     def __new__(cls, a=0, b=1):
+        if type(a) is int and type(b) is int:       # Most common case
+            return cls.from_ints(a, b)
+
         # Invalid argument type
-        if not (isinstance(a, (int, float, str, frac)) and isinstance(b, (int, float, str, frac))):
-            raise FractionError("Invalid arguments passed - Only 'int', 'float', 'str' and 'frac' objects are accepted")
+        if not (isinstance(a, (int, float, str, numbers.Rational)) and isinstance(b, (int, float, str, numbers.Rational))):
+            raise FractionError("Invalid arguments passed - Only 'int', 'float', 'str', 'frac' and 'Fraction' objects are accepted")
 
-        if isinstance(a, int):
-            a_ = a
+        if isinstance(a, int):              # int() turns bools and other int subclasses into plain ints
+            a_ = int(a)
             b_ = 1
         elif isinstance(a, float):
-            float_parts = str(a).split(".")
-            a_ = int("".join(float_parts))
-            b_ = 10**len(float_parts[1])
+            a_, b_ = cls._float_pair(a)
         elif isinstance(a, str):
-            if cls._expression_match(a, cls._t1):
-                a_, b_ = [int(i) for i in a.split('/')]
-            elif cls._expression_match(a, cls._t2_1) or cls._expression_match(a, cls._t2_2):
-                portions = a.split(".")
-                sign = 1 - 2*(portions[0][0] == '-')
-                a_ = abs(int(portions[0]))
-                if len(portions) == 1:
-                    b_ = 1
-                else:
-                    post_decimal = portions[1]
-                    b_ = 10**len(post_decimal)
-                    a_ = a_*b_ + int(post_decimal)
-                a_ *= sign
-            elif cls._expression_match(a, cls._t3):
-                portions = [i for i in a.split(".") if i]
-                b_ = 10**len(portions[1]) - 1
-                a_ = (1 - 2*(portions[0][0] == '-'))*(abs(int(portions[0]))*b_ + int(portions[1]))
-            elif cls._expression_match(a, cls._t4):
-                portions = [i for i in a.split(".") if i]
-                sign = 1 - 2*(portions[0][0] == '-')
-                pre_decimal = abs(int(portions[0]))
-                post_decimal_1, post_decimal_2 = portions[1].split("_")
-                l1 = len(post_decimal_1)
-                l2 = len(post_decimal_2)
-                post_decimal_1, post_decimal_2 = int(post_decimal_1), int(post_decimal_2)
-                b_ = 10**l1 * (10**l2 - 1)
-                a_ = pre_decimal*b_ + post_decimal_1*(b_ // 10**l1) + post_decimal_2
-                a_ *= sign
-
-            else:
+            pair = cls._parse_pair(a)
+            if pair is None:
                 raise FractionError("Invalid string input format")
+            a_, b_ = pair
         else:
             a_ = a.numerator
             b_ = a.denominator
@@ -168,46 +866,302 @@ Constructor:
 
         # Base case for initialization
         if isinstance(b, int):
-            a = a_
-            b *= b_
-        else:
-            f2 = frac(b)
-            a = a_ * f2.denominator
-            b = b_ * f2.numerator
+            return cls.from_ints(a_, int(b) * b_)
+        f2 = frac(b)
+        return cls.from_ints(a_ * f2.denominator, b_ * f2.numerator)
 
+    # Fast constructors, for when the numerator and denominator are already known
+    # to be integers. They skip the type checks and string parsing of frac(a, b)
+    # from_ints(a, b)    -->   a by b, after fixing the sign and reducing to co-primes
+    # from_reduced(a, b) -->   a by b as is. The caller guarantees that b > 0 and that
+    #                          a and b are co-prime. Nothing is checked
+    @classmethod
+    def from_ints(cls, a, b=1):
+        if b == 1:
+            return cls.from_reduced(a, 1)
         if b < 0:               # Managing signs
-            a *= -1
-            b *= -1
+            a = -a
+            b = -b
+        elif b == 0:
+            raise FractionError("Denominator can't be zero")
 
         # Reducing to co-primes
         gcd_ = math.gcd(a, b)
-        a //= gcd_
-        b //= gcd_
-        cls._latest_a = a
-        cls._latest_b = b
-        
-        return cls._instance_space.get((a, b), super().__new__(cls))
-
-    # Initialization, with exception handling
-    def __init__(self, *args):
-        a = self._latest_a
-        b = self._latest_b
-        if (a, b) not in self._instance_space:
-            self._instance_space[(a, b)] = self
-            self._numerator = a
-            self._denominator = b
-
-            # All these attributes are evaluated during the first call to them
-            # and are then stored to make subsequent use of their corresponding
-            # methods faster
-            # Fractions are meant to be immutable, so after the numerator and
-            # denominator are assigned during the initialization, there is no
-            # need to re-evaluate these attributes
-            self._int = None
-            self._decimal = None
-            self._float = None
-            self._repr = None
-            self._str = None
+        if gcd_ != 1:
+            a //= gcd_
+            b //= gcd_
+        return cls.from_reduced(a, b)
+
+    # Returns the interned instance for the reduced pair (a, b), creating it if needed
+    # Everything is set up here rather than in __init__, so that no state is shared
+    # between the two calls and fractions can be created from several threads at once
+    @classmethod
+    def from_reduced(cls, a, b=1):
+        key = (a, b)
+        instance = cls._instance_space.get(key)
+        if instance is None:
+            instance = object.__new__(cls)
+            instance._numerator = a
+            instance._denominator = b
+            instance._cache = None
+            instance = cls._instance_space.add(key, instance)
+        return instance
+
+    # Returns the numerator and denominator of anything frac() accepts, without
+    # creating a frac object for ints and fracs
+    @staticmethod
+    def _as_pair(x):
+        if isinstance(x, frac):
+            return x._numerator, x._denominator
+        if type(x) is int:
+            return x, 1
+        x = frac(x)
+        return x._numerator, x._denominator
+
+    # Combines the (numerator, denominator) pairs from 'pairs' with merge() in a balanced
+    # binary tree, so that operands of about the same size are combined at every level
+    # Only O(log n) partial results are held at a time, so 'pairs' can be a generator
+    # merge() doesn't reduce its result. It's only reduced when its denominator grows past
+    # 'normalize_bits' bits, and once at the end
+    # Returns the result as a reduced pair
+    @staticmethod
+    def _tree_reduce(pairs, merge, normalize_bits, empty):
+        gcd = math.gcd
+        stack = []
+        for n, d in pairs:
+            level = 0
+            while stack and stack[-1][0] == level:
+                _, n2, d2 = stack.pop()
+                n, d = merge(n2, d2, n, d)
+                if d.bit_length() > normalize_bits:
+                    g = gcd(n, d)
+                    n //= g
+                    d //= g
+                level += 1
+            stack.append((level, n, d))
+        if not stack:
+            return empty
+        _, n, d = stack.pop()
+        while stack:
+            _, n2, d2 = stack.pop()
+            n, d = merge(n2, d2, n, d)
+        g = gcd(n, d)
+        return n // g, d // g
+
+    # Exact sum of the values in an iterable (anything frac() accepts)
+    # Much faster than adding the values one by one with +, as every + reduces its
+    # result with a gcd over an ever growing denominator
+    # Ex: frac.sum(frac((-1)**i, 2*i+1) for i in range(10000)) is pi/4, roughly
+    @classmethod
+    def sum(cls, iterable, normalize_bits=4096):
+        return cls._result(*cls._tree_reduce(map(cls._as_pair, iterable), _add_unreduced, normalize_bits, (0, 1)))
+
+    # Exact product of the values in an iterable (anything frac() accepts)
+    @classmethod
+    def prod(cls, iterable, normalize_bits=4096):
+        return cls._result(*cls._tree_reduce(map(cls._as_pair, iterable), _mul_unreduced, normalize_bits, (1, 1)))
+
+    # Exact sum of term_fn(i) for i in range(start, stop)
+    # term_fn can return anything frac() accepts, or a (numerator, denominator) tuple
+    # of ints, which is the fastest as no frac object is created for the terms. Tuples can
+    # have negative denominators, and a zero denominator raises a FractionError
+    # Ex: frac.series(lambda i: ((-1)**i, 2*i+1), 0, 10000) is the same sum as above
+    @classmethod
+    def series(cls, term_fn, start, stop, normalize_bits=4096):
+        divisor = cls._divisor           # Moves the sign to the numerator, and rejects zero
+        def pairs():
+            for i in range(start, stop):
+                term = term_fn(i)
+                yield divisor(*term) if type(term) is tuple else cls._as_pair(term)
+        return cls._result(*cls._tree_reduce(pairs(), _add_unreduced, normalize_bits, (0, 1)))
+
+    # frac.sum and frac.prod, spread over several processes, for very large inputs
+    # The values are split into one contiguous chunk per worker, every chunk is reduced
+    # in its own process, and the partial results are combined here
+    # workers  : number of worker processes (os.cpu_count() by default)
+    # executor : a concurrent.futures executor to use instead of starting a new process
+    #            pool, so that a pool can be reused across calls. It isn't shut down
+    # Inputs with fewer than frac.parallel_min_size values are reduced in this process,
+    # as starting the workers and sending them the values would take longer
+    @classmethod
+    def parallel_sum(cls, iterable, workers=None, executor=None, normalize_bits=4096):
+        return cls._parallel_reduce('sum', iterable, workers, executor, normalize_bits)
+
+    @classmethod
+    def parallel_prod(cls, iterable, workers=None, executor=None, normalize_bits=4096):
+        return cls._parallel_reduce('prod', iterable, workers, executor, normalize_bits)
+
+    @classmethod
+    def _parallel_reduce(cls, kind, iterable, workers, executor, normalize_bits):
+        pairs = list(map(cls._as_pair, iterable))
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if workers < 2 or len(pairs) < cls.parallel_min_size:
+            return cls._result(*_reduce_chunk(kind, pairs, normalize_bits))
+
+        size = -(-len(pairs) // workers)
+        chunks = [pairs[i:i + size] for i in range(0, len(pairs), size)]
+        arguments = (itertools.repeat(kind), chunks, itertools.repeat(normalize_bits))
+        if executor is None:
+            with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+                partials = list(pool.map(_reduce_chunk, *arguments))
+        else:
+            partials = list(executor.map(_reduce_chunk, *arguments))
+        merge, empty = _REDUCTIONS[kind]
+        return cls._result(*cls._tree_reduce(partials, merge, normalize_bits, empty))
+
+    # Returns the numerator and denominator (not reduced) of a float
+    # exact=False  -->  the shortest decimal that rounds to x, which is what repr(x) shows
+    #                   (Ex: 0.1 -> 1 by 10, 1e-05 -> 1 by 100000)
+    # exact=True   -->  the exact binary value of x (Ex: 0.1 -> 3602879701896397 by 36028797018963968)
+    #                   This is faster, as no string is involved
+    @staticmethod
+    def _float_pair(x, exact=False):
+        if not math.isfinite(x):
+            raise FractionError(f"Can't convert {x} to a fraction")
+        if exact:
+            return x.as_integer_ratio()
+        if x.is_integer() and abs(x) < 2**53:     # Larger floats print as their shortest decimal, like 1e+23
+            return int(x), 1
+        mantissa, _, exponent = repr(x).partition('e')
+        pre_decimal, _, post_decimal = mantissa.partition('.')
+        a = int(pre_decimal + post_decimal)
+        b = 10**len(post_decimal)
+        if exponent:
+            exponent = int(exponent)
+            if exponent > 0:
+                a *= 10**exponent
+            else:
+                b *= 10**-exponent
+        return a, b
+
+    # frac from a float, either its shortest decimal representation (like frac(x)),
+    # or with exact=True, its exact binary value
+    # Ex: frac.from_float(1e-05) = 1 by 100000
+    @classmethod
+    def from_float(cls, x, exact=False):
+        return cls.from_ints(*cls._float_pair(float(x), exact))
+
+    # frac objects from a sequence of floats, or a fracarray if as_array is True
+    # Buffer protocol objects (array('d'), memoryview, numpy arrays and so on) are read
+    # directly as a block of numbers
+    # Unlike from_float, exact defaults to True: the exact values come straight from the
+    # bits of each float, whereas the shortest decimals need a string for every element
+    @classmethod
+    def from_floats(cls, sequence, exact=True, as_array=False):
+        try:
+            view = memoryview(sequence)
+        except TypeError:                   # Not a buffer
+            values = sequence
+        else:
+            # The items are unpacked with struct, which understands byte order prefixes
+            # (Ex: '<d' for ctypes arrays, or non-native numpy arrays), unlike memoryview.cast
+            # Strided views can't be cast to bytes, so they're copied in C order first
+            data = view.cast('B') if view.c_contiguous else view.tobytes()
+            values = [x for x, in struct.iter_unpack(view.format, data)]
+        float_pair = cls._float_pair
+        pairs = [float_pair(float(x), exact) for x in values]
+        if not exact:
+            return cls._parsed_values(pairs, as_array)
+        if as_array:
+            from fracarray import fracarray, _pack
+            return fracarray._from_buffers(_pack([a for a, b in pairs]), _pack([b for a, b in pairs]))
+        from_reduced = cls.from_reduced
+        return [from_reduced(a, b) for a, b in pairs]
+
+    # Bulk parsing of string input, in any of the formats accepted by frac()
+    # Instead of raising an exception on the first invalid token, both methods return
+    # a tuple (values, errors), where errors is a list of (position, token) pairs for
+    # the tokens that couldn't be parsed (invalid format or zero denominator)
+    # values is a list of frac objects, or a fracarray if as_array is True, in which case
+    # no frac object is created at all
+    #
+    # parse_many(iterable)  -->  one token per item (leading and trailing whitespace is
+    #                            ignored). Positions are indices in the iterable, and
+    #                            items that aren't strings are reported as errors too
+    # parse_buffer(data)    -->  whitespace separated tokens from bytes (or any bytes-like
+    #                            object, such as a memoryview or mmap). Positions are byte offsets
+    # Ex: frac.parse_many(['1/2', 'x', '0.1_6...']) = ([Fraction: 1 by 2, Fraction: 1 by 6], [(1, 'x')])
+    @classmethod
+    def parse_many(cls, iterable, as_array=False):
+        parse = cls._parse_pair
+        pairs = []
+        errors = []
+        for position, token in enumerate(iterable):
+            pair = parse(token.strip()) if isinstance(token, str) else None
+            if pair is None or pair[1] == 0:
+                errors.append((position, token))
+            else:
+                pairs.append(pair)
+        return cls._parsed_values(pairs, as_array), errors
+
+    _token = re.compile(rb'\S+')
+
+    @classmethod
+    def parse_buffer(cls, data, as_array=False):
+        parse = cls._parse_pair
+        bytes_format = cls._bytes_format
+        pairs = []
+        errors = []
+        for match in cls._token.finditer(data):
+            token = match[0]
+            pair = parse(token, bytes_format)
+            if pair is None or pair[1] == 0:
+                errors.append((match.start(), token))
+            else:
+                pairs.append(pair)
+        return cls._parsed_values(pairs, as_array), errors
+
+    @classmethod
+    def _parsed_values(cls, pairs, as_array):
+        if as_array:
+            from fracarray import fracarray
+            return fracarray.from_ints([a for a, b in pairs], [b for a, b in pairs])
+        from_ints = cls.from_ints
+        return [from_ints(a, b) for a, b in pairs]
+
+    # Binary serialization, much faster to read back than text as there's nothing to parse
+    # A fraction a/b is stored as two varints (see _write_varint): 2*|a| + (1 if a < 0 else 0),
+    # then b. Small fractions take 2 bytes (Ex: frac(-1, 2).to_bytes() = b'\x03\x02')
+    # to_bytes()            -->  the encoded fraction
+    # frac.from_bytes(data) -->  the fraction encoded in data, which can be any bytes-like object
+    #                            Raises a FractionError if data isn't exactly one encoded fraction
+    def to_bytes(self):
+        out = bytearray()
+        self._write_pair(self._numerator, self._denominator, out)
+        return bytes(out)
+
+    @classmethod
+    def from_bytes(cls, data):
+        a, b, end = cls._read_pair(data, 0)
+        if end != len(data):
+            raise FractionError("Unexpected bytes after the encoded fraction")
+        return cls.from_ints(a, b)
+
+    @staticmethod
+    def _write_pair(a, b, out):
+        _write_varint(2*a if a >= 0 else -2*a + 1, out)
+        _write_varint(b, out)
+
+    # Returns the numerator and denominator encoded at data[pos], and the position after them
+    # They aren't reduced, as the data can't be trusted to be
+    @staticmethod
+    def _read_pair(data, pos):
+        a, pos = _read_varint(data, pos)
+        b, pos = _read_varint(data, pos)
+        if b == 0:
+            raise FractionError("Denominator can't be zero")
+        return (-(a >> 1) if a & 1 else a >> 1), b, pos
+
+    # Returns the cached value called name, evaluating it with compute() on the first call
+    def _cached(self, name, compute):
+        cache = self._cache
+        if cache is None:
+            cache = self._cache = {}
+        value = cache.get(name)
+        if value is None:
+            value = cache[name] = compute()
+        return value
 
     @property
     def numerator(self):
@@ -219,12 +1173,15 @@ Constructor:
 
     @property
     def decimal(self):
-        if self._decimal is None:
-            self._decimal = self._decimal_repr()
-        return self._decimal
+        return self._cached('decimal', self._decimal_repr)
 
-    def reciprocal(self):           # Returns the reciprocal of the instance, if it exists (denominator != 0)
-       return frac(self._denominator, self._numerator)
+    def reciprocal(self):           # Returns the reciprocal of the instance, if it exists (numerator != 0)
+        a = self._numerator
+        if a > 0:
+            return frac.from_reduced(self._denominator, a)
+        if a < 0:
+            return frac.from_reduced(-self._denominator, -a)
+        raise FractionError("Denominator can't be zero")
 
     # Returns the decimal representation of the fraction as a string
     # Examples:
@@ -238,131 +1195,980 @@ Constructor:
         a = self._numerator
         b = self._denominator
 
-        pre_decimal_string = str(a // b) + "."
-        a %= b
+        if a % b == 0:      # If 'b' completely divides 'a'
+            return str(a // b) + ".0"
 
-        if a == 0:      # If 'b' completely divides 'a'
-            return pre_decimal_string + "0"
+        places, digits = self._bounded_period(b, frac.max_repeating_digits)
+        if digits > frac.max_repeating_digits:     # To prevent it from taking a long long time
+            # The warning points at the code that read .decimal, past _cached and the property,
+            # and past the metrics wrapper around this method while metrics are enabled
+            stacklevel = 4
+            if frac._metrics is not None and '_decimal_repr' in frac._metrics.originals:
+                stacklevel += 1
+            warnings.warn(f"Repeating digits truncated to {frac.max_repeating_digits}. "
+                          "Use frac.max_repeating_digits to change", FractionWarning, stacklevel=stacklevel)
+            if frac._metrics is not None:
+                frac._metrics.truncations += 1
+            digits = frac.max_repeating_digits
+        return "".join(self._decimal_pieces(places, digits))
 
-        places, digits = self._decimal_helper(b)
-        n = a * 10**places              # To evaluate the non-repeating part
-        non_repeating_string = ""
+    # Yields the decimal representation in pieces of up to 1000 characters, given the
+    # number of non-repeating digits and the number of repeating digits to show
+    # The fraction mustn't be an integer
+    def _decimal_pieces(self, places, digits):
+        a = self._numerator
+        b = self._denominator
+        yield str(a // b) + "."
+        a %= b
         if places:                      # If there is a non-repeating part
-            non_repeating_string = str(n // b).zfill(places) + "_"
+            yield from self._digit_chunks(a, b, places)
+            if digits:
+                yield "_"
+            a = a * pow(10, places, b) % b
         if digits:                      # If there is a repeating part
-            repeating_string = str(((n % b) * 10**digits) // b).zfill(digits)
-            return pre_decimal_string + non_repeating_string + repeating_string + "..."
+            yield from self._digit_chunks(a, b, digits)
+            yield "..."
+
+    # Coroutine versions, for asyncio programs, which mustn't block the event loop
+    # decimal_parts_async(executor)            -->  decimal_parts(). The number of repeating digits
+    #                                               is found in 'executor', as it can take seconds
+    #                                               for denominators with large prime factors
+    # decimal_async(executor, max_digits)      -->  .decimal. The number of digits is found in
+    #                                               'executor' too, but only up to the budget (see
+    #                                               _bounded_period), and the digits are then computed
+    #                                               1000 at a time, letting other tasks run in between
+    # digits_async(start, stop)                -->  digits(start, stop), in the same way
+    # executor can be any concurrent.futures executor (a ProcessPoolExecutor keeps the work out of
+    # this process entirely). It defaults to frac.decimal_executor, and if that's None too, to the
+    # event loop's default executor
+    # max_digits is a budget for the repeating digits of this call, used instead of
+    # frac.max_repeating_digits (and no warning is given when the digits are cut there)
+    # The result of decimal_async is stored in the same cache as .decimal whenever it's what
+    # .decimal would return, and taken from that cache when .decimal was already evaluated
+    # Cancelling one of these stops it at the next chunk of digits. A search for the number of
+    # digits that's already running in a thread can't be interrupted, but its result is cached
+    # Ex: text = await frac(1, 100003).decimal_async(max_digits=10**5)
+    async def decimal_parts_async(self, executor=None):
+        import asyncio
+        a = self._numerator
+        b = self._denominator
+        if b == 1:
+            return (a, 0, 0)
+        if executor is None:
+            executor = frac.decimal_executor
+        places, period = await asyncio.get_running_loop().run_in_executor(executor, frac._decimal_helper, b)
+        return (a // b, places, period)
+
+    async def decimal_async(self, executor=None, max_digits=None):
+        import asyncio
+        cache = self._cache
+        if cache is not None and 'decimal' in cache:
+            return cache['decimal']
+        if self._numerator % self._denominator == 0:
+            return self.decimal
+
+        if executor is None:
+            executor = frac.decimal_executor
+        limit = max(frac.max_repeating_digits, max_digits or 0)
+        places, digits = await asyncio.get_running_loop().run_in_executor(executor, frac._bounded_period,
+                                                                          self._denominator, limit)
+        full = min(digits, frac.max_repeating_digits)
+        if max_digits is None:
+            if digits > frac.max_repeating_digits:
+                warnings.warn(f"Repeating digits truncated to {frac.max_repeating_digits}. "
+                              "Use frac.max_repeating_digits to change", FractionWarning, stacklevel=2)
+                if frac._metrics is not None:
+                    frac._metrics.truncations += 1
+            max_digits = frac.max_repeating_digits
+        digits = min(digits, max_digits)
+
+        pieces = []
+        for piece in self._decimal_pieces(places, digits):
+            pieces.append(piece)
+            await asyncio.sleep(0)
+        result = "".join(pieces)
+        if digits == full:
+            self._cached('decimal', lambda: result)
+        return result
+
+    async def digits_async(self, start, stop):
+        import asyncio
+        if start < 0 or stop < start:
+            raise FractionError("Invalid digit range")
+        pieces = []
+        for piece in self._digit_chunks(self._shifted_remainder(start), self._denominator, stop - start):
+            pieces.append(piece)
+            await asyncio.sleep(0)
+        return "".join(pieces)
+
+    # Yields the digits after the decimal point of r/b, for 0 <= r < b, as strings
+    # of up to 1000 digits. Stops after 'count' digits, or never if count is None
+    # Working in chunks keeps the memory used constant, and stays below Python's
+    # limit on the length of int to str conversions
+    @staticmethod
+    def _digit_chunks(r, b, count=None):
+        while count is None or count > 0:
+            k = 1000 if count is None else min(count, 1000)
+            q, r = divmod(r * 10**k, b)
+            yield str(q).zfill(k)
+            if count is not None:
+                count -= k
+
+    # Returns the remainder r such that r/denominator is the part of the
+    # fraction after the decimal point, shifted left by 'start' places
+    def _shifted_remainder(self, start):
+        b = self._denominator
+        return self._numerator % b * pow(10, start, b) % b
 
-        return pre_decimal_string + non_repeating_string[:-1]
+    # Returns (integer part, number of non-repeating digits, number of repeating digits)
+    # These describe the decimal expansion without computing any of it. Like .decimal,
+    # the integer part is rounded down, so the digits are those of 'a - math.floor(a)'
+    # Ex: frac(22, 700).decimal_parts() = (0, 2, 6)  as 22/700 = 0.03_142857...
+    def decimal_parts(self):
+        places, period = self._decimal_helper(self._denominator)
+        if self._numerator % self._denominator == 0:
+            places = 0
+        return (self._numerator // self._denominator, places, period)
+
+    # Digit number 'k' after the decimal point (the first one is at k = 0)
+    # Takes O(log k) steps, as 10**k is only evaluated modulo the denominator
+    def digit(self, k):
+        if k < 0:
+            raise FractionError("Digit positions start at 0")
+        b = self._denominator
+        return self._shifted_remainder(k) * 10 // b
 
+    # The digits after the decimal point from position 'start' up to, but not
+    # including, 'stop', as a string
+    # Ex: frac(1, 7).digits(3, 9) = '857142'
+    def digits(self, start, stop):
+        if start < 0 or stop < start:
+            raise FractionError("Invalid digit range")
+        return "".join(self._digit_chunks(self._shifted_remainder(start), self._denominator, stop - start))
 
+    # Lazily yields the digits after the decimal point (as ints), starting at
+    # position 'start'. There's no limit on the number of repeating digits, and
+    # only one chunk of digits is held in memory at a time
+    # Never stops for repeating decimals. For terminating ones, stops after the last
+    # non-zero digit
+    # Only the factors 2 and 5 are taken out of the denominator, to tell whether the
+    # expansion terminates. The period itself is never needed, so unlike decimal_parts,
+    # this doesn't factorize the denominator
+    # Ex: itertools.islice(frac(1, 7).iter_digits(), 8) yields 1, 4, 2, 8, 5, 7, 1, 4
+    def iter_digits(self, start=0):
+        if start < 0:
+            raise FractionError("Digit positions start at 0")
+        places, rest = self._split_denominator(self._denominator)
+        count = None
+        if rest == 1:
+            count = max(places - start, 0)
+        for chunk in self._digit_chunks(self._shifted_remainder(start), self._denominator, count):
+            yield from map(int, chunk)
+
+
+    # int / int is evaluated by Python with integer arithmetic and is correctly rounded
+    # (half to even), even when the numerator and denominator are too large to be
+    # converted to floats themselves
     def _float_repr(self):
-        # Passes at least 16 decimal places to the float function, and
-        # at least one cycle of the repeating digits, if they exist
-        decimal_string = self.decimal
-        if decimal_string[-1] != ".":
-            return float(decimal_string)
-
-        exp = re.compile(r'\.|_')
-        parts = exp.split(decimal_string[:-3])
-
-        if len(parts) == 2:
-            repeating = len(parts[1])
-            return float(parts[0] + "." + parts[1]*math.ceil(16/repeating))
-        else:
-            non_repeating = len(parts[1])
-            repeating = len(parts[2])
-            repeating_cycles = math.ceil((16 - non_repeating) / repeating)
-            if repeating_cycles == 0:
-                repeating_cycles = 1
-            return float(parts[0] + "." + parts[1] + parts[2]*repeating_cycles)
+        return self._numerator / self._denominator
+
+    # Pickling and copying
+    # A pickled fraction is rebuilt with from_reduced, so the copy is interned like any
+    # other fraction (and is the same object, in the same process). Only the numerator
+    # and denominator are stored, not the cached values
+    def __reduce__(self):
+        return (frac.from_reduced, (self._numerator, self._denominator))
+
+    def __copy__(self):             # Fractions are immutable, so copies are the same object
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
 
     def __str__(self):
-        if self._str is None:
-            self._str = str(self._numerator) + '/' + str(self._denominator)
-        return self._str
+        return self._cached('str', lambda: str(self._numerator) + '/' + str(self._denominator))
  
     def __repr__(self):
-        if self._repr is None:
-            self._repr = "Fraction: " + str(self._numerator) + " by " + str(self._denominator)
-        return self._repr
+        return self._cached('repr', lambda: "Fraction: " + str(self._numerator) + " by " + str(self._denominator))
+
+    # Implements format(a, spec) and f-strings (see _FORMAT_SPEC for the syntax)
+    # Unlike slicing .decimal, only the requested digits are computed, with one integer
+    # division, and the last one is rounded half to even from the exact value
+    # Ex: f"{frac(2, 3):.4f}" = '0.6667', f"{frac(1, 8):.2%}" = '12.50%', f"{frac(10**9, 7):,.3e}" = '1.429e+08'
+    def __format__(self, format_spec):
+        return _formatter(format_spec)(self._numerator, self._denominator)
+
+    # Formats every value of 'values' (an iterable of anything frac() accepts, or a
+    # fracarray) with the same format spec, which is only parsed once
+    # The values of a fracarray are formatted straight from its buffers, without
+    # creating frac objects
+    # Ex: frac.format_many(['1/3', 0.5, 2], '.3f') = ['0.333', '0.500', '2.000']
+    @classmethod
+    def format_many(cls, values, format_spec=''):
+        format_pair = _formatter(format_spec)
+        from fracarray import fracarray
+        if isinstance(values, fracarray):
+            return list(map(format_pair, values.numerators, values.denominators))
+        as_pair = cls._as_pair
+        return [format_pair(*as_pair(x)) for x in values]
 
+    # Returns the numerator and denominator of 'other', for the operators below
+    # ints, fracs and fractions.Fraction objects (or any other numbers.Rational, which
+    # are always in lowest terms) are used directly, without creating a frac object
+    # Anything else goes through frac(), and NotImplemented is returned if that fails,
+    # so that the operators give the other operand's reflected method a chance (Python
+    # raises a TypeError if that doesn't work either)
     @staticmethod
-    def _try_conversion(other):      # Attempts to convert 'other' to a 'frac' object with a try...except clause
+    def _operand(other):
         if isinstance(other, frac):
-            return other
+            return other._numerator, other._denominator
+        if isinstance(other, int):
+            return int(other), 1
+        if isinstance(other, numbers.Rational):
+            return other.numerator, other.denominator
         try:
-            return frac(other)
+            other = frac(other)
         except FractionError:
-            raise TypeError(f"{type(other)} object can't be interpreted as a 'frac' object")
+            return NotImplemented
+        return other._numerator, other._denominator
+
+    # Fractions and ints are hashed like Python's own numbers, so frac(3) == 3 and
+    # frac(1, 3) == Fraction(1, 3) have equal hashes and work as the same dictionary key
+    # For a/b, that's a * b**-1 modulo the prime sys.hash_info.modulus (see the
+    # 'Hashing of numeric types' section of the Python docs)
+    def __hash__(self):
+        return self._cached('hash', self._hash)
+
+    def _hash(self):
+        a = self._numerator
+        try:
+            inverse = pow(self._denominator, -1, _HASH_MODULUS)
+        except ValueError:      # The denominator is a multiple of the modulus
+            value = _HASH_INF
+        else:
+            value = hash(hash(abs(a)) * inverse)
+        if a < 0:
+            value = -value
+        return -2 if value == -1 else value
+
+    # Returns the numerator and denominator of 'other' for the comparisons, like _operand,
+    # except that floats are compared with their exact binary value (as fractions.Fraction
+    # does) rather than their shortest decimal. Otherwise frac(1, 10) == 0.1 would be true
+    # while hash(frac(1, 10)) != hash(0.1), and they'd be different dictionary keys
+    # Infinities and nan give NotImplemented, and so do strings: frac(1, 2) == '1/2' would
+    # also make equal objects with different hashes, so strings are never equal to fractions
+    # (and can't be ordered with them). Parse them first, with frac(s)
+    @staticmethod
+    def _compared(other):
+        if isinstance(other, frac):
+            return other._numerator, other._denominator
+        if isinstance(other, float):
+            if math.isfinite(other):
+                return other.as_integer_ratio()
+            return NotImplemented
+        if isinstance(other, str):
+            return NotImplemented
+        return frac._operand(other)
 
+    # Equal fractions that are alive at the same time are usually the same object, thanks
+    # to the instance space, so identity is tested first
+    # Both sides are in lowest terms, so otherwise they're only equal if their numerators
+    # and denominators are
     def __eq__(self, other):        # Implements a == b 
-        other = self._try_conversion(other)
-        return self._numerator == other._numerator and self._denominator == other._denominator
+        if other is self:
+            return True
+        if type(other) is int:
+            return self._denominator == 1 and self._numerator == other
+        other = self._compared(other)
+        if other is NotImplemented:
+            return other
+        return self._numerator == other[0] and self._denominator == other[1]
+
+    # Compares n1/d1 with n2/d2 (d1, d2 > 0), and returns -1, 0 or 1
+    # The exact test multiplies big integers, so cheaper tests come first, and the first
+    # one that can tell the two fractions apart gives the result:
+    #   denominators     -->  equal denominators (ints, for example) only need the numerators
+    #   signs            -->  a negative fraction is smaller than a positive one
+    #   bit lengths      -->  |n/d| is between 2**(len(n) - len(d) - 1) and 2**(len(n) - len(d) + 1)
+    #   integer parts    -->  floor(n/d), whose cost is linear in the size of d when the quotient is small
+    #   float estimates  -->  of the remainders r/d of the integer parts. int / int is correctly
+    #                         rounded, so estimates further apart than 2**-50 are in the right order
+    #   exact            -->  r1*d2 against r2*d1, on the remainders rather than on the numerators
+    # The operators only call it when a denominator is at least _COMPARE_LIMIT. Below that,
+    # the products are cheaper than the tests, and are compared right away
+    @staticmethod
+    def _compare(n1, d1, n2, d2):
+        if d1 == d2:
+            return (n1 > n2) - (n1 < n2)
+        sign = (n1 > 0) - (n1 < 0)
+        other_sign = (n2 > 0) - (n2 < 0)
+        if sign != other_sign:
+            return 1 if sign > other_sign else -1
+        if not sign:
+            return 0
+        bits = n1.bit_length() - d1.bit_length() - n2.bit_length() + d2.bit_length()
+        if bits >= 2:                   # |n1/d1| > |n2/d2|
+            return sign
+        if bits <= -2:
+            return -sign
+        q1, r1 = divmod(n1, d1)
+        q2, r2 = divmod(n2, d2)
+        if q1 != q2:
+            return 1 if q1 > q2 else -1
+        f1 = r1 / d1
+        f2 = r2 / d2
+        if abs(f1 - f2) > 2**-50:
+            return 1 if f1 > f2 else -1
+        a = r1*d2
+        b = r2*d1
+        return (a > b) - (a < b)
 
     def __lt__(self, other):        # Implements a < b
-        other = self._try_conversion(other)
-        return self._numerator*other._denominator < other._numerator*self._denominator
+        other = self._compared(other)
+        if other is NotImplemented:
+            return other
+        n2, d2 = other
+        d1 = self._denominator
+        if d1 < _COMPARE_LIMIT and d2 < _COMPARE_LIMIT:
+            return self._numerator*d2 < n2*d1
+        return frac._compare(self._numerator, d1, n2, d2) < 0
 
     def __le__(self, other):       # Implements a <= b
-        return self < other or self == other
+        other = self._compared(other)
+        if other is NotImplemented:
+            return other
+        n2, d2 = other
+        d1 = self._denominator
+        if d1 < _COMPARE_LIMIT and d2 < _COMPARE_LIMIT:
+            return self._numerator*d2 <= n2*d1
+        return frac._compare(self._numerator, d1, n2, d2) <= 0
 
     def __gt__(self, other):        # Implements a > b
-        other = self._try_conversion(other)
-        return self._numerator*other._denominator > other._numerator*self._denominator
+        other = self._compared(other)
+        if other is NotImplemented:
+            return other
+        n2, d2 = other
+        d1 = self._denominator
+        if d1 < _COMPARE_LIMIT and d2 < _COMPARE_LIMIT:
+            return self._numerator*d2 > n2*d1
+        return frac._compare(self._numerator, d1, n2, d2) > 0
 
     def __ge__(self, other):       # Implements a >= b
-        return self > other or self == other
+        other = self._compared(other)
+        if other is NotImplemented:
+            return other
+        n2, d2 = other
+        d1 = self._denominator
+        if d1 < _COMPARE_LIMIT and d2 < _COMPARE_LIMIT:
+            return self._numerator*d2 >= n2*d1
+        return frac._compare(self._numerator, d1, n2, d2) >= 0
 
     def __ne__(self, other):        # Implements a != b
-        return not self == other
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
+
+    # Returns the result n/d of an operation (reduced, d > 0), which is snapped to the closest
+    # fraction with a small enough denominator inside a frac.bounded block
+    @staticmethod
+    def _result(n, d):
+        bound = _max_denominator.get()
+        if bound is not None and d > bound:
+            n, d = frac._limit_denominator(n, d, bound)
+        return frac.from_reduced(n, d)
 
+    # Addition and subtraction of reduced fractions n1/d1 and n2/d2, by Henrici's method
+    # With g = gcd(d1, d2), the sum is (n1*(d2/g) + n2*(d1/g)) / (d1*d2/g), and the only
+    # factors the numerator t can still share with the denominator are those of g.
+    # So the result only needs gcd(t, g), instead of a gcd of the full cross products
+    @staticmethod
+    def _add_pairs(n1, d1, n2, d2):
+        g = math.gcd(d1, d2)
+        if g == 1:
+            return frac._result(n1*d2 + n2*d1, d1*d2)
+        s = d1 // g
+        t = n1*(d2 // g) + n2*s
+        g2 = math.gcd(t, g)
+        if g2 == 1:
+            return frac._result(t, s*d2)
+        return frac._result(t // g2, s*(d2 // g2))
+
+    # Adding an integer k to a reduced a/b gives (a + k*b)/b, which is still reduced,
+    # so ints skip the gcds altogether
     def __add__(self, other):       # Implements a + b
-        other = self._try_conversion(other)
-        return frac(self._numerator*other._denominator + self._denominator*other._numerator, self._denominator*other._denominator)
+        if type(other) is int:
+            return frac._result(self._numerator + other*self._denominator, self._denominator)
+        other = self._operand(other)
+        if other is NotImplemented:
+            return other
+        return self._add_pairs(self._numerator, self._denominator, *other)
 
-    def __sub__(self, other):
-        return self + (-other)
+    def __sub__(self, other):       # Implements a - b
+        if type(other) is int:
+            return frac._result(self._numerator - other*self._denominator, self._denominator)
+        other = self._operand(other)
+        if other is NotImplemented:
+            return other
+        return self._add_pairs(self._numerator, self._denominator, -other[0], other[1])
     
-    def __rsub__(self, other):
-        return other + (-self)
+    def __rsub__(self, other):      # Implements b - a
+        if type(other) is int:
+            return frac._result(other*self._denominator - self._numerator, self._denominator)
+        other = self._operand(other)
+        if other is NotImplemented:
+            return other
+        return self._add_pairs(other[0], other[1], -self._numerator, self._denominator)
+
+    # Multiplication of reduced fractions n1/d1 and n2/d2
+    # Any common factor of the product is shared by n1 and d2, or by n2 and d1, so
+    # dividing those out first gives the reduced product directly, with smaller gcds
+    # and smaller products
+    @staticmethod
+    def _mul_pairs(n1, d1, n2, d2):
+        g1 = math.gcd(n1, d2)
+        if g1 != 1:
+            n1 //= g1
+            d2 //= g1
+        g2 = math.gcd(n2, d1)
+        if g2 != 1:
+            n2 //= g2
+            d1 //= g2
+        return frac._result(n1*n2, d1*d2)
 
     def __mul__(self, other):       # Implements a * b
-        other = self._try_conversion(other)
-        return frac(self._numerator*other._numerator, self._denominator*other._denominator)
+        if type(other) is int:
+            g = math.gcd(other, self._denominator)
+            return frac._result(self._numerator * (other // g), self._denominator // g)
+        other = self._operand(other)
+        if other is NotImplemented:
+            return other
+        return self._mul_pairs(self._numerator, self._denominator, *other)
 
     def __radd__(self, other):      # Implements b + a
-        return self + other
+        return self.__add__(other)
     
     def __rmul__(self, other):      # Implements b * a
-        return self * other
+        return self.__mul__(other)
 
-    def __int__(self):              # Implements int(a)
-        if self._int is None:
-            self._int = self._numerator // self._denominator
-        return self._int
+    def __int__(self):              # Implements int(a), rounding towards zero like int(float)
+        return self._cached('int', self.__trunc__)
 
     def __float__(self):            # Implements float(a)
-        if self._float is None:
-            self._float = self._float_repr()
-        return self._float
+        return self._cached('float', self._float_repr)
 
-    def __bool_(self):
-        return bool(self.numerator)
+    def __bool__(self):             # Implements bool(a)
+        return self._numerator != 0
+
+    # Returns n2/d2 with the sign moved to the numerator, for dividing by it
+    @staticmethod
+    def _divisor(n2, d2):
+        if d2 <= 0:
+            if d2 == 0:
+                raise FractionError("Denominator can't be zero")
+            return -n2, -d2
+        return n2, d2
 
     def __truediv__(self, other):       # Implements a / b
-        other = self._try_conversion(other)
-        return self * other.reciprocal()
+        other = self._operand(other)
+        if other is NotImplemented:
+            return other
+        n2, d2 = self._divisor(other[1], other[0])
+        return self._mul_pairs(self._numerator, self._denominator, n2, d2)
 
     def __rtruediv__(self, other):      # Implements b / a
-        other = self._try_conversion(other)
-        return other / self
+        other = self._operand(other)
+        if other is NotImplemented:
+            return other
+        n2, d2 = self._divisor(self._denominator, self._numerator)
+        return self._mul_pairs(other[0], other[1], n2, d2)
+
+    # Floor division and remainder, defined like those of ints and Fractions, so that
+    # a == (a // b)*b + a % b and the remainder has the sign of b
+    # n1/d1 by n2/d2 is (n1*d2) by (n2*d1) over the common denominator d1*d2, so the
+    # quotient and remainder come from a single integer divmod
+    @staticmethod
+    def _divmod_pairs(n1, d1, n2, d2):
+        if n2 == 0:
+            raise FractionError("Denominator can't be zero")
+        q, r = divmod(n1*d2, n2*d1)
+        return q, frac.from_ints(r, d1*d2)
+
+    def __floordiv__(self, other):      # Implements a // b
+        other = self._operand(other)
+        if other is NotImplemented:
+            return other
+        if other[0] == 0:
+            raise FractionError("Denominator can't be zero")
+        return (self._numerator * other[1]) // (other[0] * self._denominator)
+
+    def __rfloordiv__(self, other):     # Implements b // a
+        other = self._operand(other)
+        if other is NotImplemented:
+            return other
+        if self._numerator == 0:
+            raise FractionError("Denominator can't be zero")
+        return (other[0] * self._denominator) // (self._numerator * other[1])
+
+    def __mod__(self, other):           # Implements a % b
+        other = self._operand(other)
+        if other is NotImplemented:
+            return other
+        return self._divmod_pairs(self._numerator, self._denominator, *other)[1]
+
+    def __rmod__(self, other):          # Implements b % a
+        other = self._operand(other)
+        if other is NotImplemented:
+            return other
+        return self._divmod_pairs(*other, self._numerator, self._denominator)[1]
+
+    def __divmod__(self, other):        # Implements divmod(a, b)
+        other = self._operand(other)
+        if other is NotImplemented:
+            return other
+        return self._divmod_pairs(self._numerator, self._denominator, *other)
+
+    def __rdivmod__(self, other):       # Implements divmod(b, a)
+        other = self._operand(other)
+        if other is NotImplemented:
+            return other
+        return self._divmod_pairs(*other, self._numerator, self._denominator)
     
     def __neg__(self):                # Implements -a
-        return frac(-self._numerator, self._denominator)
+        return frac.from_reduced(-self._numerator, self._denominator)
+
+    def __pos__(self):                # Implements +a
+        return self
 
+    def __abs__(self):                # Implements abs(a)
+        if self._numerator >= 0:
+            return self
+        return frac.from_reduced(-self._numerator, self._denominator)
+
+    # Rounding to integers, as required by numbers.Rational
+    def __trunc__(self):              # Implements math.trunc(a)
+        if self._numerator < 0:
+            return -(-self._numerator // self._denominator)
+        return self._numerator // self._denominator
+
+    def __floor__(self):              # Implements math.floor(a)
+        return self._numerator // self._denominator
+
+    def __ceil__(self):               # Implements math.ceil(a)
+        return -(-self._numerator // self._denominator)
+
+    # round(a) rounds half to even and returns an int, round(a, n) returns a frac
+    # rounded to n decimal places (n can be negative), also half to even
+    def __round__(self, ndigits=None):  # Implements round(a) and round(a, n)
+        if ndigits is None:
+            q, r = divmod(self._numerator, self._denominator)
+            if 2*r > self._denominator or (2*r == self._denominator and q % 2 == 1):
+                q += 1
+            return q
+        shift = 10 ** abs(ndigits)
+        if ndigits > 0:
+            return frac.from_ints(round(self * shift), shift)
+        return frac.from_reduced(round(self / shift) * shift)
+
+    # Properties required by numbers.Complex, for code written against the numeric tower
+    @property
+    def real(self):
+        return self
+
+    @property
+    def imag(self):
+        return 0
+
+    def conjugate(self):
+        return self
+
+    def __complex__(self):            # Implements complex(a)
+        return complex(float(self))
+
+    # Powers
+    # a**k for an integer k   -->   exact. Powers of co-primes are co-prime, so there's nothing to reduce
+    # a**(p/q)                -->   exact when the numerator and denominator of a are both perfect
+    #                               q-th powers (Ex: frac(4, 9)**frac(1, 2) = 2/3, frac(8)**frac(-2, 3) = 1/4).
+    #                               Otherwise the result isn't rational, and a float (or a complex, for
+    #                               even roots of negative numbers) is returned, like Fraction does
+    # a**x for a float x      -->   float(a)**x, like Fraction, even when x is a whole number
+    # a.pow(e)                -->   the exact power, or a FractionError if it isn't rational
+    # a.pow(e, max_denominator) --> the fraction closest to the power among those with a denominator
+    #                               of at most max_denominator. It's the exact power if that fits
+    # Exponents can be ints, fracs, Fractions, or anything else frac() accepts. pow() also
+    # accepts floats, as the fraction they stand for (0.5 is treated as 1/2)
     def __pow__(self, other):       # Implements a**b
-        return frac(self._numerator ** other, self._denominator ** other)
+        if type(other) is int:
+            if other < 0:
+                return self.reciprocal() ** -other
+            return frac._result(self._numerator ** other, self._denominator ** other)
+        if isinstance(other, float):
+            return float(self) ** other
+        other = self._operand(other)
+        if other is NotImplemented:
+            return other
+        result = self._rational_power(self._numerator, self._denominator, *other)
+        if result is None:
+            return float(self) ** (other[0] / other[1])
+        return frac._result(*result)
 
+    # Float and complex bases give a float (or complex) result, as with Fraction
     def __rpow__(self, other):      # Implements b**a
-        return other ** float(self)
+        if isinstance(other, (float, complex)):
+            return other ** float(self)
+        pair = self._operand(other)
+        if pair is NotImplemented:
+            return pair
+        return frac.from_reduced(*pair) ** self
+
+    def pow(self, exponent, max_denominator=None):
+        exponent = self._operand(exponent)
+        if exponent is NotImplemented:
+            raise FractionError("Invalid exponent - Only 'int', 'float', 'str', 'frac' and 'Fraction' objects are accepted")
+        p, q = exponent
+        a, b = self._numerator, self._denominator
+        result = self._rational_power(a, b, p, q)
+        if result is not None:
+            if max_denominator is None or result[1] <= max_denominator:
+                return frac.from_reduced(*result)
+            return frac.from_reduced(*self._limit_denominator(*result, max_denominator))
+        if max_denominator is None:
+            raise FractionError(f"{self} to the power {p}/{q} isn't rational, use max_denominator for an approximation")
+        if a < 0 and q % 2 == 0:
+            raise FractionError(f"{self} has no real root of order {q}")
+        return frac.from_reduced(*self._approximate_power(a, b, p, q, max_denominator))
+
+    # Returns a**b as a reduced pair for a reduced a and a reduced rational exponent p/q,
+    # or None if it isn't rational
+    @staticmethod
+    def _rational_power(a, b, p, q):
+        if p < 0:
+            if a == 0:
+                raise FractionError("Denominator can't be zero")
+            a, b, p = (b, a, -p) if a > 0 else (-b, -a, -p)
+        if q != 1:
+            if a < 0 and q % 2 == 0:
+                return None
+            ra = _iroot(abs(a), q)
+            if ra**q != abs(a):
+                return None
+            rb = _iroot(b, q)
+            if rb**q != b:
+                return None
+            a, b = (ra if a >= 0 else -ra), rb
+        return a**p, b**p
+
+    # The closest fraction to n/d (d > 0) with a denominator of at most max_denominator,
+    # as a reduced pair. The candidates are the last convergent p1/q1 of the continued
+    # fraction of n/d that fits, and the largest semiconvergent between it and the previous one
+    # They're 1/(q1*q) apart (q being the semiconvergent's denominator) and n/d is
+    # b/(q1*d) away from p1/q1, so p1/q1 is the closest one if 2*b*q <= d
+    @staticmethod
+    def _limit_denominator(n, d, max_denominator):
+        if max_denominator < 1:
+            raise FractionError("max_denominator must be at least 1")
+        g = math.gcd(n, d)          # The loop below needs a reduced pair, or it ends with b = 0
+        n, d = n // g, d // g
+        if d <= max_denominator:
+            return n, d
+        p0, q0, p1, q1 = 0, 1, 1, 0
+        a, b = n, d
+        while True:
+            k = a // b
+            q2 = q0 + k*q1
+            if q2 > max_denominator:
+                break
+            p0, q0, p1, q1 = p1, q1, p0 + k*p1, q2
+            a, b = b, a - k*b
+        k = (max_denominator - q0) // q1
+        if 2*b*(q0 + k*q1) <= d:
+            return p1, q1
+        return p0 + k*p1, q0 + k*q1
+
+    # The closest fraction to the irrational (a/b)**(p/q), with a denominator of at most
+    # max_denominator, as a reduced pair
+    # The power is evaluated as exp(p/q * ln(a/b)) with the decimal module, and the answer
+    # is only accepted if it's the same for both ends of the error bounds of that value
+    # (the fractions closest to the points of an interval are all the same if they're
+    # the same at both ends). Otherwise it's evaluated again with twice the precision
+    @staticmethod
+    def _approximate_power(a, b, p, q, max_denominator):
+        negative = a < 0 and p % 2 == 1
+        precision = 2*len(str(max_denominator)) + 20
+        while True:
+            context = decimal.Context(prec=precision, Emax=decimal.MAX_EMAX, Emin=decimal.MIN_EMIN)
+            log = context.ln(context.divide(decimal.Decimal(abs(a)), decimal.Decimal(b)))
+            exponent = context.divide(context.multiply(log, p), q)
+            n, d = context.exp(exponent).as_integer_ratio()
+            # Every step above is correctly rounded, so the relative error of the power is
+            # at most this many units in the last place
+            error = 20 * (int(abs(exponent)) + abs(p) // q + 2)
+            scale = 10 ** precision
+            if error < scale:
+                low = frac._limit_denominator(n*(scale - error), d*scale, max_denominator)
+                high = frac._limit_denominator(n*(scale + error), d*scale, max_denominator)
+                if low == high:
+                    n, d = low
+                    return (-n if negative else n), d
+            precision *= 2
+
+    # Approximation
+    # continued_fraction()       -->  the terms [a0, a1, ..., an] of the continued fraction
+    #                                 a0 + 1/(a1 + 1/(... + 1/an)) of the fraction
+    #                                 Ex: frac(415, 93).continued_fraction() = [4, 2, 6, 7]
+    # convergents()              -->  an iterator over the convergents, the fractions given by the
+    #                                 first 1, 2, ... terms. Each one is the closest fraction to
+    #                                 this one with a denominator that small. The last one is exact
+    # frac.from_continued_fraction(terms)  -->  the fraction with the given terms
+    # limit_denominator(max_denominator)   -->  the closest fraction with a denominator of at
+    #                                           most max_denominator
+    # approximate(tolerance)     -->  the simplest fraction (the one with the smallest denominator)
+    #                                 at most 'tolerance' away from this one
+    #                                 Ex: frac(355, 113).approximate(0.01) = 22/7
+    def continued_fraction(self):
+        terms = []
+        a, b = self._numerator, self._denominator
+        while b:
+            q, r = divmod(a, b)
+            terms.append(q)
+            a, b = b, r
+        return terms
+
+    def convergents(self):
+        p0, q0, p1, q1 = 0, 1, 1, 0
+        for term in self.continued_fraction():
+            p0, q0, p1, q1 = p1, q1, term*p1 + p0, term*q1 + q0
+            yield frac.from_reduced(p1, q1)
+
+    @classmethod
+    def from_continued_fraction(cls, terms):
+        terms = list(terms)
+        if not terms:
+            raise FractionError("A continued fraction needs at least one term")
+        p0, q0, p1, q1 = 0, 1, 1, 0
+        for term in terms:
+            if type(term) is not int:
+                raise FractionError("Continued fraction terms must be ints")
+            p0, q0, p1, q1 = p1, q1, term*p1 + p0, term*q1 + q0
+        return cls.from_ints(p1, q1)
+
+    def limit_denominator(self, max_denominator=10**6):
+        return frac.from_reduced(*self._limit_denominator(self._numerator, self._denominator, max_denominator))
+
+    def approximate(self, tolerance):
+        t1, t2 = self._as_pair(tolerance)
+        if t1 < 0:
+            raise FractionError("The tolerance can't be negative")
+        a, b = self._numerator, self._denominator
+        # The interval is [a/b - t1/t2, a/b + t1/t2] = [low/d, high/d]
+        d = b*t2
+        low = a*t2 - t1*b
+        high = a*t2 + t1*b
+        if low <= 0 <= high:
+            return frac.from_reduced(0)
+        if high < 0:
+            return -frac.from_continued_fraction(self._simplest_between(-high, d, -low, d))
+        return frac.from_continued_fraction(self._simplest_between(low, d, high, d))
+
+    # Returns the continued fraction terms of the simplest fraction between n1/d1 and n2/d2,
+    # for 0 < n1/d1 <= n2/d2. If there's an integer in the interval, it's the smallest one.
+    # Otherwise both ends have the same integer part q, and the answer is q + 1/x for the
+    # simplest x between 1/(n2/d2 - q) and 1/(n1/d1 - q)
+    @staticmethod
+    def _simplest_between(n1, d1, n2, d2):
+        terms = []
+        while True:
+            q, r = divmod(n1, d1)
+            if r == 0:
+                terms.append(q)
+                return terms
+            if (q + 1)*d2 <= n2:
+                terms.append(q + 1)
+                return terms
+            terms.append(q)
+            n1, d1, n2, d2 = d2, n2 - q*d2, d1, r
+
+    # Bounded mode, for long computations where exactness up to a tolerance is enough
+    # Inside a 'with frac.bounded(max_denominator):' block, the results of +, -, *, /, **,
+    # frac.sum, frac.prod and frac.series are snapped to the closest fraction with a denominator
+    # of at most max_denominator (see limit_denominator), so the size of the numbers (and
+    # the cost of every operation) stops growing. Fractions created with frac() aren't
+    # changed, and neither are the results of //, % and divmod, so that a == (a // b)*b + a % b
+    # The bound only applies to the current thread (or asyncio task). Blocks can be nested,
+    # and max_denominator=None turns the bound off inside a bounded block
+    # Ex: with frac.bounded(max_denominator=10**12):
+    #         for i in range(10**6):
+    #             x = x*x - c                # Stays cheap, instead of doubling in size every time
+    @staticmethod
+    @contextlib.contextmanager
+    def bounded(max_denominator):
+        if max_denominator is not None and max_denominator < 1:
+            raise FractionError("max_denominator must be at least 1")
+        token = _max_denominator.set(max_denominator)
+        try:
+            yield
+        finally:
+            _max_denominator.reset(token)
+
+
+class fracaccumulator:
+    '''Mutable fractions, for building up a result in a loop
+
+Constructor:
+    fracaccumulator()            -->       an accumulator holding 0
+    fracaccumulator(x)           -->       an accumulator holding x (anything frac() accepts)
+
+    acc += x on a frac creates a new frac at every step, reduces it with a gcd over its whole
+    numerator and denominator and interns it, even though the next step throws it away.
+    An accumulator updates a raw numerator and denominator in place instead. Sums keep the
+    denominator at the lcm of the denominators added (a gcd with the small operand is
+    enough for that), and the full reduction only happens when the denominator grows past
+    normalize_bits bits (which then doubles), or when the value is read
+    Nothing goes through the instance space until freeze()
+
+    Supported operations:
+        +=, -=, *=, /=               with anything frac() accepts, or another accumulator
+        freeze()                     the current value as a frac (snapped inside frac.bounded,
+                                     like the results of frac's operators)
+        numerator, denominator       in lowest terms
+        float(acc)
+
+    Example:
+        >>> acc = fracaccumulator()
+        >>> for i in range(10000):
+        ...     acc += frac((-1)**i, 2*i+1)
+        ...
+        >>> my_pi = 4*acc.freeze()'''
+
+    __slots__ = ('_numerator', '_denominator', '_limit', 'normalize_bits')
+
+    def __init__(self, value=0, normalize_bits=4096):
+        pair = self._operand(value)
+        if pair is NotImplemented:
+            raise FractionError(f"Can't accumulate {value!r}")
+        self._numerator, self._denominator = pair
+        self.normalize_bits = normalize_bits
+        self._limit = normalize_bits
+
+    # Returns the numerator and denominator of 'other' (with a positive denominator, not
+    # necessarily reduced), or NotImplemented if it can't be used. Floats and strings are
+    # converted without creating a frac
+    @staticmethod
+    def _operand(other):
+        if isinstance(other, (frac, fracaccumulator)):
+            return other._numerator, other._denominator
+        if isinstance(other, int):
+            return int(other), 1
+        if isinstance(other, numbers.Rational):
+            return other.numerator, other.denominator
+        try:
+            if isinstance(other, float):
+                return frac._float_pair(other)
+            if isinstance(other, str):
+                pair = frac._parse_pair(other)
+                if pair is not None:
+                    return frac._divisor(*pair)
+        except FractionError:
+            pass
+        return NotImplemented
+
+    # Reduces the numerator and denominator to co-primes, and moves the threshold for
+    # the next reduction to twice the size of the reduced denominator
+    def _reduce(self):
+        g = math.gcd(self._numerator, self._denominator)
+        if g != 1:
+            self._numerator //= g
+            self._denominator //= g
+        self._limit = max(self.normalize_bits, 2*self._denominator.bit_length())
+
+    def _add(self, n2, d2):
+        d1 = self._denominator
+        if d1 == d2:
+            self._numerator += n2
+            return
+        g = math.gcd(d1, d2)
+        if g == 1:
+            self._numerator = self._numerator*d2 + n2*d1
+            self._denominator = d1*d2
+        else:
+            self._numerator = self._numerator*(d2 // g) + n2*(d1 // g)
+            self._denominator = d1*(d2 // g)
+        if self._denominator.bit_length() > self._limit:
+            self._reduce()
+
+    # Like frac._mul_pairs, dividing out the factors n1 shares with d2 and n2 with d1
+    # Both gcds involve the (usually small) operand, so they're cheap
+    def _mul(self, n2, d2):
+        n1, d1 = self._numerator, self._denominator
+        g1 = math.gcd(n1, d2)
+        g2 = math.gcd(n2, d1)
+        self._numerator = (n1 // g1) * (n2 // g2)
+        self._denominator = (d1 // g2) * (d2 // g1)
+        if self._denominator.bit_length() > self._limit:
+            self._reduce()
+
+    def __iadd__(self, other):          # Implements acc += b
+        if type(other) is int:
+            self._numerator += other*self._denominator
+            return self
+        other = self._operand(other)
+        if other is NotImplemented:
+            return other
+        self._add(*other)
+        return self
+
+    def __isub__(self, other):          # Implements acc -= b
+        if type(other) is int:
+            self._numerator -= other*self._denominator
+            return self
+        other = self._operand(other)
+        if other is NotImplemented:
+            return other
+        self._add(-other[0], other[1])
+        return self
+
+    def __imul__(self, other):          # Implements acc *= b
+        other = self._operand(other)
+        if other is NotImplemented:
+            return other
+        self._mul(*other)
+        return self
+
+    def __itruediv__(self, other):      # Implements acc /= b
+        other = self._operand(other)
+        if other is NotImplemented:
+            return other
+        self._mul(*frac._divisor(other[1], other[0]))
+        return self
+
+    @property
+    def numerator(self):
+        self._reduce()
+        return self._numerator
+
+    @property
+    def denominator(self):
+        self._reduce()
+        return self._denominator
+
+    def freeze(self):
+        self._reduce()
+        return frac._result(self._numerator, self._denominator)
+
+    def __float__(self):                # Implements float(acc)
+        return self._numerator / self._denominator
+
+    def __repr__(self):
+        self._reduce()
+        return f"fracaccumulator('{self._numerator}/{self._denominator}')"
+
+# Lets fractions.Fraction, the statistics module and anything else that checks for
+# numbers.Rational (or numbers.Number) accept fracs
+numbers.Rational.register(frac)
+
+# python -m frac runs the command line interface (see fraccli.py)
+# fraccli imports this file again as the 'frac' module, so that it uses the same frac
+# class as every other module
+if __name__ == '__main__':
+    import fraccli
+    sys.exit(fraccli.main(sys.argv[1:]))
@@ -0,0 +1,278 @@
+# An array of fractions, for working with many fractions at once
+
+from frac import frac, FractionError
+from array import array
+import itertools
+import math
+
+
+# Stores the integers in an int64 buffer if they all fit, and in a list
+# of Python ints (which have no size limit) otherwise
+def _pack(values):
+    try:
+        return array('q', values)
+    except OverflowError:
+        return list(values)
+
+
+# Elementwise operations on reduced numerator/denominator sequences
+# Each one returns the (reduced) numerators and denominators of the results as lists
+# They use the same gcd splitting as frac's operators, without creating frac objects
+
+def _add(n1, d1, n2, d2):
+    gcd = math.gcd
+    nums = []
+    dens = []
+    for a, b, c, d in zip(n1, d1, n2, d2):
+        g = gcd(b, d)
+        if g == 1:
+            nums.append(a*d + c*b)
+            dens.append(b*d)
+        else:
+            s = b // g
+            t = a*(d // g) + c*s
+            g2 = gcd(t, g)
+            nums.append(t // g2)
+            dens.append(s*(d // g2))
+    return nums, dens
+
+def _mul(n1, d1, n2, d2):
+    gcd = math.gcd
+    nums = []
+    dens = []
+    for a, b, c, d in zip(n1, d1, n2, d2):
+        g1 = gcd(a, d)
+        g2 = gcd(c, b)
+        nums.append((a // g1) * (c // g2))
+        dens.append((b // g2) * (d // g1))
+    return nums, dens
+
+def _sub(n1, d1, n2, d2):
+    return _add(n1, d1, [-c for c in n2], d2)
+
+def _div(n1, d1, n2, d2):
+    n2 = list(n2)
+    if 0 in n2:
+        raise FractionError("Denominator can't be zero")
+    nums = [d if c > 0 else -d for c, d in zip(n2, d2)]
+    dens = [abs(c) for c in n2]
+    return _mul(n1, d1, nums, dens)
+
+
+class fracarray:
+    '''Arrays of fractions
+
+Constructor:
+    fracarray()                  -->       an empty array
+    fracarray(iterable)          -->       an array of frac(x) for every x in the iterable
+    fracarray.from_ints(n, d)    -->       an array of n[i] by d[i], for sequences of ints n and d
+
+    The numerators and denominators are stored in two separate buffers, as 64 bit integers
+    when they fit and as Python ints otherwise. Operations work on the whole buffers at
+    once, without creating a frac object (or looking one up in frac's instance space)
+    for every element
+
+    Supported operations:
+        +, -, *, /                   elementwise, with another fracarray of the same length,
+                                     or with a single value (anything frac() accepts)
+        -a                           elementwise negation
+        ==, !=, <, <=, >, >=         elementwise, returning a list of bools
+        sum(), prod(), min(), max()  reductions, returning a frac
+        a[i], a[i:j], len(a), iter   indexing returns a frac, slicing returns a fracarray
+        to_float(), tolist()         an array('d') of floats, a list of frac objects
+
+    Example:
+        >>> a = fracarray([frac(1, 2), '1/3', 0.25])
+        >>> print(a + 1)
+        fracarray(['3/2', '4/3', '5/4'])
+        >>> print(a.sum())
+        13/12'''
+
+    __slots__ = ('_numerators', '_denominators')
+
+    def __init__(self, values=()):
+        nums = []
+        dens = []
+        for x in values:
+            if not isinstance(x, frac):
+                x = frac(x)
+            nums.append(x.numerator)
+            dens.append(x.denominator)
+        self._numerators = _pack(nums)
+        self._denominators = _pack(dens)
+
+    # Builds an array directly from (already reduced) numerator and denominator buffers
+    @classmethod
+    def _from_buffers(cls, nums, dens):
+        instance = object.__new__(cls)
+        instance._numerators = nums
+        instance._denominators = dens
+        return instance
+
+    # An array of numerators[i] by denominators[i], after fixing the signs and reducing
+    @classmethod
+    def from_ints(cls, numerators, denominators):
+        nums = []
+        dens = []
+        gcd = math.gcd
+        for a, b in zip(numerators, denominators, strict=True):
+            if b <= 0:
+                if b == 0:
+                    raise FractionError("Denominator can't be zero")
+                a, b = -a, -b
+            g = gcd(a, b)
+            nums.append(a // g)
+            dens.append(b // g)
+        return cls._from_buffers(_pack(nums), _pack(dens))
+
+    @property
+    def numerators(self):
+        return self._numerators
+
+    @property
+    def denominators(self):
+        return self._denominators
+
+    def __len__(self):
+        return len(self._numerators)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self._from_buffers(self._numerators[index], self._denominators[index])
+        return frac.from_reduced(self._numerators[index], self._denominators[index])
+
+    def __iter__(self):
+        return map(frac.from_reduced, self._numerators, self._denominators)
+
+    def tolist(self):
+        return list(self)
+
+    # Correctly rounded floats, as an array('d')
+    def to_float(self):
+        return array('d', map(int.__truediv__, self._numerators, self._denominators))
+
+    def __repr__(self):
+        return "fracarray(" + repr([f"{a}/{b}" for a, b in zip(self._numerators, self._denominators)]) + ")"
+
+    # Returns the numerators and denominators of 'other', repeated to the length of
+    # this array if it's a single value, or NotImplemented if it can't be used
+    def _operand(self, other):
+        if isinstance(other, fracarray):
+            if len(other) != len(self):
+                raise FractionError(f"Lengths don't match: {len(self)} and {len(other)}")
+            return other._numerators, other._denominators
+        if not isinstance(other, frac):
+            try:
+                other = frac(other)
+            except FractionError:
+                return NotImplemented
+        n = len(self)
+        return itertools.repeat(other.numerator, n), itertools.repeat(other.denominator, n)
+
+    def _elementwise(self, other, operation, reflected=False):
+        operand = self._operand(other)
+        if operand is NotImplemented:
+            return operand
+        if reflected:
+            nums, dens = operation(*operand, self._numerators, self._denominators)
+        else:
+            nums, dens = operation(self._numerators, self._denominators, *operand)
+        return self._from_buffers(_pack(nums), _pack(dens))
+
+    def __add__(self, other):           # Implements a + b
+        return self._elementwise(other, _add)
+
+    def __radd__(self, other):          # Implements b + a
+        return self._elementwise(other, _add, True)
+
+    def __sub__(self, other):           # Implements a - b
+        return self._elementwise(other, _sub)
+
+    def __rsub__(self, other):          # Implements b - a
+        return self._elementwise(other, _sub, True)
+
+    def __mul__(self, other):           # Implements a * b
+        return self._elementwise(other, _mul)
+
+    def __rmul__(self, other):          # Implements b * a
+        return self._elementwise(other, _mul, True)
+
+    def __truediv__(self, other):       # Implements a / b
+        return self._elementwise(other, _div)
+
+    def __rtruediv__(self, other):      # Implements b / a
+        return self._elementwise(other, _div, True)
+
+    def __neg__(self):                  # Implements -a
+        return self._from_buffers(_pack([-a for a in self._numerators]), self._denominators)
+
+    # Elementwise comparisons, returning a list of bools
+    def _compare(self, other, compare):
+        operand = self._operand(other)
+        if operand is NotImplemented:
+            return operand
+        return [compare(a*d, c*b) for a, b, c, d in zip(self._numerators, self._denominators, *operand)]
+
+    def __eq__(self, other):
+        return self._compare(other, int.__eq__)
+
+    def __ne__(self, other):
+        return self._compare(other, int.__ne__)
+
+    def __lt__(self, other):
+        return self._compare(other, int.__lt__)
+
+    def __le__(self, other):
+        return self._compare(other, int.__le__)
+
+    def __gt__(self, other):
+        return self._compare(other, int.__gt__)
+
+    def __ge__(self, other):
+        return self._compare(other, int.__ge__)
+
+    __hash__ = None             # == is elementwise, so arrays can't be hashed
+
+    # Reductions
+    # The sum and product are accumulated on raw numerators and denominators,
+    # so only the final result is created as a frac
+
+    def sum(self):
+        gcd = math.gcd
+        a, b = 0, 1
+        for c, d in zip(self._numerators, self._denominators):
+            g = gcd(b, d)
+            if g == 1:
+                a, b = a*d + c*b, b*d
+            else:
+                s = b // g
+                t = a*(d // g) + c*s
+                g2 = gcd(t, g)
+                a, b = t // g2, s*(d // g2)
+        return frac.from_reduced(a, b)
+
+    def prod(self):
+        gcd = math.gcd
+        a, b = 1, 1
+        for c, d in zip(self._numerators, self._denominators):
+            g1 = gcd(a, d)
+            g2 = gcd(c, b)
+            a, b = (a // g1) * (c // g2), (b // g2) * (d // g1)
+        return frac.from_reduced(a, b)
+
+    # Returns the first element x such that better(x, y) is false for all others y
+    def _extreme(self, better):
+        if not len(self):
+            raise FractionError("Empty fracarray has no minimum or maximum")
+        pairs = zip(self._numerators, self._denominators)
+        a, b = next(pairs)
+        for c, d in pairs:
+            if better(c*b, a*d):
+                a, b = c, d
+        return frac.from_reduced(a, b)
+
+    def min(self):
+        return self._extreme(int.__lt__)
+
+    def max(self):
+        return self._extreme(int.__gt__)
@@ -0,0 +1,189 @@
+# Command line interface, run with 'python -m frac'
+#
+#   python -m frac [FILE ...] [--float | --decimal | --format SPEC] [--workers N]
+#                  [--chunk-size BYTES] [--skip-invalid] [--stats]
+#
+# Reads whitespace separated fractions, in any of the formats frac() accepts, from the
+# files (or from stdin, if there are none or for '-') and prints their count, and their
+# exact sum, mean, minimum and maximum
+# The input is read in chunks of --chunk-size bytes, cut at whitespace so that no token is
+# split, so the memory used doesn't depend on its size. Every chunk is parsed in bulk into
+# a fracarray and reduced there, and the sums of the chunks are added up in a fracaccumulator
+# With --workers N, the chunks are parsed and reduced by N processes, with at most 2*N
+# chunks in flight at a time
+# Invalid tokens are listed on stderr (the first few of them) with their byte offsets.
+# The exit status is then 1, unless --skip-invalid is given
+
+from frac import frac, fracaccumulator, _reduce_chunk
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import collections
+import sys
+import time
+
+_CHUNK_SIZE = 1 << 20
+_WHITESPACE = (b' ', b'\t', b'\n', b'\r', b'\x0b', b'\x0c')
+_SHOWN_ERRORS = 10              # Invalid tokens listed on stderr
+
+
+# Yields (offset, chunk) for the chunks of a binary file, with the byte offset of each
+# chunk. Chunks end at whitespace, and the rest of the block read is carried over to the
+# next one (a token longer than a block makes the chunk grow until it ends)
+def _chunks(file, size):
+    offset = 0
+    tail = b''
+    while True:
+        block = file.read(size)
+        if not block:
+            break
+        data = tail + block
+        cut = max(data.rfind(space) for space in _WHITESPACE) + 1
+        if cut:
+            yield offset, data[:cut]
+            offset += cut
+            tail = data[cut:]
+        else:
+            tail = data
+    if tail:
+        yield offset, tail
+
+
+# Parses and reduces one chunk. Returns (count, sum, min, max, errors), where min and max
+# are None for chunks without any valid token, and errors is the list of (offset, token)
+# of parse_buffer
+# The sum is added up in a balanced tree, like frac.sum, as the denominators of inputs
+# like repeating decimals make a running sum grow quickly
+# This runs in the worker processes, so it's a module level function
+def _aggregate(data):
+    values, errors = frac.parse_buffer(data, as_array=True)
+    if not len(values):
+        return 0, frac(0), None, None, errors
+    total = frac.from_reduced(*_reduce_chunk('sum', zip(values.numerators, values.denominators), 4096))
+    return len(values), total, values.min(), values.max(), errors
+
+
+# The totals over every chunk of every file
+class _Totals:
+    def __init__(self):
+        self.sum = fracaccumulator()
+        self.count = 0
+        self.min = None
+        self.max = None
+        self.invalid = 0
+        self.bytes = 0
+        self.shown = []             # (file name, offset, token) of the first invalid tokens
+
+    def add(self, name, offset, size, result):
+        count, total, low, high, errors = result
+        self.bytes += size
+        if count:
+            self.count += count
+            self.sum += total
+            if self.min is None or low < self.min:
+                self.min = low
+            if self.max is None or high > self.max:
+                self.max = high
+        self.invalid += len(errors)
+        for position, token in errors[:_SHOWN_ERRORS - len(self.shown)]:
+            self.shown.append((name, offset + position, token))
+
+
+# Feeds the chunks of a file to 'totals', in order
+# With an executor, up to 'ahead' chunks are reduced at once. Their results are still
+# added in the order of the chunks, so that the invalid tokens are listed in order
+def _read(file, name, totals, chunk_size, executor=None, ahead=1):
+    if executor is None:
+        for offset, data in _chunks(file, chunk_size):
+            totals.add(name, offset, len(data), _aggregate(data))
+        return
+    pending = collections.deque()
+    for offset, data in _chunks(file, chunk_size):
+        pending.append((offset, len(data), executor.submit(_aggregate, data)))
+        if len(pending) >= ahead:
+            offset, size, future = pending.popleft()
+            totals.add(name, offset, size, future.result())
+    for offset, size, future in pending:
+        totals.add(name, offset, size, future.result())
+
+
+def _size(count):
+    for unit in ('B', 'kB', 'MB', 'GB'):
+        if count < 1000:
+            break
+        count /= 1000
+    return f"{count:.4g} {unit}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m frac',
+                                     description="Exact count, sum, mean, minimum and maximum of the whitespace "
+                                                 "separated fractions in the files (or stdin), in any format frac() accepts")
+    parser.add_argument('files', nargs='*', metavar='FILE', help="files to read ('-' for stdin, the default)")
+    output = parser.add_mutually_exclusive_group()
+    output.add_argument('--float', action='store_true', help="print the results as floats")
+    output.add_argument('--decimal', action='store_true', help="print the results as decimals (with repeating digits)")
+    output.add_argument('--format', metavar='SPEC', help="print the results with this format spec (Ex: .20f)")
+    parser.add_argument('--workers', type=int, default=1, help="processes parsing the input (default 1, this one)")
+    parser.add_argument('--chunk-size', type=int, default=_CHUNK_SIZE, help=f"bytes read at a time (default {_CHUNK_SIZE})")
+    parser.add_argument('--skip-invalid', action='store_true', help="ignore invalid tokens")
+    parser.add_argument('--stats', action='store_true', help="print the throughput on stderr")
+    args = parser.parse_args(argv)
+    if args.workers < 1 or args.chunk_size < 1:
+        parser.error("--workers and --chunk-size must be positive")
+    if args.format is not None:
+        try:
+            format(frac(0), args.format)
+        except ValueError as error:
+            parser.error(str(error))
+
+    totals = _Totals()
+    start = time.perf_counter()
+    executor = ProcessPoolExecutor(args.workers) if args.workers > 1 else None
+    try:
+        for name in args.files or ['-']:
+            if name == '-':
+                _read(sys.stdin.buffer, '<stdin>', totals, args.chunk_size, executor, 2*args.workers)
+                continue
+            try:
+                with open(name, 'rb') as file:
+                    _read(file, name, totals, args.chunk_size, executor, 2*args.workers)
+            except OSError as error:
+                print(f"{parser.prog}: {error}", file=sys.stderr)
+                return 2
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    seconds = time.perf_counter() - start
+
+    if args.float:
+        show = float
+    elif args.decimal:
+        show = lambda x: x.decimal
+    elif args.format is not None:
+        show = lambda x: format(x, args.format)
+    else:
+        show = str
+    print(f"count  {totals.count}")
+    if totals.count:
+        total = totals.sum.freeze()
+        print(f"sum    {show(total)}")
+        print(f"mean   {show(total / totals.count)}")
+        print(f"min    {show(totals.min)}")
+        print(f"max    {show(totals.max)}")
+
+    if not args.skip_invalid:
+        for name, offset, token in totals.shown:
+            print(f"{name}:{offset}: invalid token {token.decode(errors='replace')!r}", file=sys.stderr)
+        if totals.invalid > len(totals.shown):
+            print(f"... {totals.invalid - len(totals.shown)} more invalid tokens", file=sys.stderr)
+    if args.stats:
+        rate = totals.bytes / seconds if seconds else 0
+        tokens = (totals.count + totals.invalid) / seconds if seconds else 0
+        print(f"read {_size(totals.bytes)} in {seconds:.3f} s ({_size(rate)}/s), "
+              f"{totals.count + totals.invalid} tokens ({tokens:,.0f}/s), {totals.invalid} invalid, "
+              f"{args.workers} worker{'s' if args.workers > 1 else ''}", file=sys.stderr)
+    return 1 if totals.invalid and not args.skip_invalid else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,182 @@
+# Column files: large tables of fractions stored on disk, read lazily through mmap
+
+from frac import frac, FractionError
+from fracarray import fracarray, _pack
+from array import array
+import mmap
+import struct
+import sys
+
+# File layout (all fixed size integers are little endian):
+#   magic                       8 bytes
+#   numerators column
+#   denominators column
+#   footer                      count, then the position and width of both columns, as
+#                               unsigned 64 bit integers, and the magic again
+# A column holds one integer per fraction, in one of two encodings:
+#   width 8  -->  signed 64 bit integers, used when every value fits. Any run of them can
+#                 be copied straight into an array('q')
+#   width 0  -->  count + 1 unsigned 64 bit offsets (relative to the end of the offsets),
+#                 followed by every value as a signed integer of as many bytes as it needs
+# The footer comes last, so the file can be written without knowing its size beforehand
+_MAGIC = b'FRACCOL1'
+_FOOTER = struct.Struct('<5Q8s')
+_INT64 = struct.Struct('<q')
+_OFFSETS = struct.Struct('<QQ')
+_CHUNK = 4096                   # Values decoded at a time while iterating
+
+
+# Writes one column of ints and returns its width
+def _write_column(file, values):
+    packed = _pack(values)
+    if isinstance(packed, array):
+        if sys.byteorder == 'big':
+            packed.byteswap()
+        file.write(packed.tobytes())
+        return 8
+    offsets = array('Q', [0])
+    data = bytearray()
+    for value in values:
+        data += value.to_bytes(value.bit_length() // 8 + 1, 'little', signed=True)
+        offsets.append(len(data))
+    if sys.byteorder == 'big':
+        offsets.byteswap()
+    file.write(offsets.tobytes())
+    file.write(data)
+    return 0
+
+
+class fraccolumn:
+    '''Read-only columns of fractions, stored in a file
+
+Constructor:
+    fraccolumn(path)                       -->  opens the column file at path
+    fraccolumn.write(path, values)         -->  writes every value (anything frac() accepts) to
+                                                a new column file at path, and returns the count
+
+    The file is memory-mapped, so nothing is read until it's needed: c[i] only reads
+    the i-th numerator and denominator, and several processes opening the same file
+    share its pages. Nothing is parsed either, as the integers are stored in binary
+    Numerators and denominators are stored in separate columns, as 64 bit integers when
+    they all fit, so that slices of small fractions are read as whole buffers
+
+    Supported operations:
+        c[i]                         the i-th fraction, as a frac
+        c[i:j]                       a fracarray of the fractions i to j
+        len(c), iter(c)
+        close(), with                the file is closed when the with block ends
+
+    Example:
+        >>> fraccolumn.write('table.frac', [frac(1, 2), '1/3', 0.25])
+        3
+        >>> with fraccolumn('table.frac') as c:
+        ...     print(c[1], len(c))
+        1/3 3'''
+
+    __slots__ = ('_file', '_map', '_count', '_columns')
+
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:          # Empty files can't be mapped
+            self._file.close()
+            raise FractionError(f"{path} isn't a fraction column file") from None
+        size = len(self._map)
+        if size < len(_MAGIC) + _FOOTER.size or self._map[:len(_MAGIC)] != _MAGIC:
+            self.close()
+            raise FractionError(f"{path} isn't a fraction column file")
+        count, *columns, magic = _FOOTER.unpack_from(self._map, size - _FOOTER.size)
+        if magic != _MAGIC or columns[1] not in (0, 8) or columns[3] not in (0, 8):
+            self.close()
+            raise FractionError(f"{path} isn't a fraction column file")
+        self._count = count
+        self._columns = ((columns[0], columns[1]), (columns[2], columns[3]))
+
+    @classmethod
+    def write(cls, path, values):
+        if isinstance(values, fracarray):
+            nums, dens = values.numerators, values.denominators
+        else:
+            nums = []
+            dens = []
+            for value in values:
+                a, b = frac._as_pair(value)
+                nums.append(a)
+                dens.append(b)
+        with open(path, 'wb') as file:
+            file.write(_MAGIC)
+            footer = [len(nums)]
+            for column in (nums, dens):
+                footer.append(file.tell())
+                footer.append(_write_column(file, column))
+            file.write(_FOOTER.pack(*footer, _MAGIC))
+        return len(nums)
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return self._count
+
+    # The value at 'index' in a column
+    def _value(self, column, index):
+        position, width = column
+        if width:
+            return _INT64.unpack_from(self._map, position + 8*index)[0]
+        start, end = _OFFSETS.unpack_from(self._map, position + 8*index)
+        data = position + 8*(self._count + 1)
+        return int.from_bytes(self._map[data + start:data + end], 'little', signed=True)
+
+    # The values from start to stop (start < stop) in a column, as an array('q') or a list
+    def _values(self, column, start, stop):
+        position, width = column
+        if width:
+            values = array('q', self._map[position + 8*start:position + 8*stop])
+            if sys.byteorder == 'big':
+                values.byteswap()
+            return values
+        offsets = array('Q', self._map[position + 8*start:position + 8*(stop + 1)])
+        if sys.byteorder == 'big':
+            offsets.byteswap()
+        base = offsets[0]
+        data_start = position + 8*(self._count + 1)
+        data = self._map[data_start + base:data_start + offsets[-1]]
+        from_bytes = int.from_bytes
+        return [from_bytes(data[offsets[i] - base:offsets[i + 1] - base], 'little', signed=True)
+                for i in range(stop - start)]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self._count)
+            if step != 1:
+                return fracarray([self[i] for i in range(start, stop, step)])
+            return self._read(start, stop)
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("fraccolumn index out of range")
+        numerators, denominators = self._columns
+        return frac.from_ints(self._value(numerators, index), self._value(denominators, index))
+
+    # The fractions from start to stop, as a fracarray
+    # They're reduced again (by fracarray.from_ints), as the file can't be trusted to be
+    def _read(self, start, stop):
+        if start >= stop:
+            return fracarray()
+        numerators, denominators = self._columns
+        return fracarray.from_ints(self._values(numerators, start, stop), self._values(denominators, start, stop))
+
+    def __iter__(self):
+        for start in range(0, self._count, _CHUNK):
+            yield from self._read(start, min(start + _CHUNK, self._count))
+
+    def __repr__(self):
+        return f"fraccolumn({self._file.name!r}, {self._count} fractions)"
@@ -0,0 +1,423 @@
+# Exact linear algebra with fractions: determinants, linear systems, inverses and ranks
+#
+# Matrices are sequences of rows, and their entries can be anything frac() accepts
+#   det(a)          -->  the determinant of the square matrix a, as a frac
+#   solve(a, b)     -->  the solution x of a x = b, for a square non-singular a. b can be a
+#                        vector (then x is a list of fracs) or a matrix (then x is a list of rows)
+#   inverse(a)      -->  the inverse of the square non-singular matrix a, as a list of rows of fracs
+#   rank(a)         -->  the rank of any matrix a
+#
+# Ex: solve([[2, 1], [1, 3]], [1, '1/2'])  =  [Fraction: 1 by 2, Fraction: 0 by 1]
+#
+# Eliminating directly on fracs makes every step go through frac's operators, with a gcd
+# and an instance space lookup for each one. Instead, every row is multiplied by the lcm of
+# its denominators, and the resulting integer matrix is eliminated with Bareiss' algorithm.
+# Every entry it produces is a minor of the matrix and divides exactly by the previous pivot,
+# so the integers stay about as large as the determinant, and nothing needs to be reduced
+# Fractions are only created for the results
+#
+#
+# Bareiss still does about n**3 / 3 operations on integers as large as the determinant,
+# which takes tens of seconds for a 200 by 200 matrix. From _MODULAR_SIZE rows onwards, the
+# integer matrix is inverted modulo a random 61 bit prime instead, where every entry stays
+# small, and the solution is lifted p-adically (Dixon's method): each step finds the next
+# base p digit of the solution with n**2 small operations. The solution is then recovered
+# from its residue modulo p**k by rational reconstruction, with k taken from Hadamard's
+# bound so that the result is exact, not probabilistic
+# The determinant is the common denominator of the solution of a x = b for a random b,
+# times a cofactor found from the determinant modulo as many primes as its size needs
+# Matrices that are singular modulo the primes tried go through Bareiss
+
+from frac import frac, FractionError, _is_prime
+from operator import mul
+import functools
+import math
+import random
+
+_MODULAR_SIZE = 32             # Smallest size solved modulo primes instead of with Bareiss
+_PRIME_BITS = 61
+_DETERMINANT_FIRST = 8          # Right hand sides from which the determinant is found first
+_random = random.Random()
+
+
+# Returns the rows of 'a' as lists of ints, each one scaled by the lcm of its denominators,
+# along with the scale factors. Rows of 'b' are appended to the rows of 'a', and scaled with them
+def _integer_rows(a, b=None):
+    rows = []
+    scales = []
+    as_pair = frac._as_pair
+    for i, row in enumerate(a):
+        pairs = [as_pair(x) for x in row]
+        if b is not None:
+            pairs += [as_pair(x) for x in b[i]]
+        scale = math.lcm(*[d for n, d in pairs]) if pairs else 1
+        rows.append([n * (scale // d) for n, d in pairs])
+        scales.append(scale)
+    return rows, scales
+
+def _square(rows):
+    n = len(rows)
+    for row in rows:
+        if len(row) != n:
+            raise FractionError("The matrix must be square")
+    return n
+
+# Fraction-free forward elimination on the integer rows 'm', over the first 'columns' columns
+# Stops at the first column without a pivot if 'stop' is True (the matrix is singular),
+# and skips over it otherwise (for the rank)
+# Returns the pivot rows (each one from its pivot column onwards), the sign of the row
+# permutation, and the pivots' columns. The last pivot is the determinant of the square
+# matrix made of the pivot rows and columns, times the sign
+def _bareiss(m, columns, stop):
+    pivots = []
+    pivot_columns = []
+    sign = 1
+    previous = 1
+    rows = m
+    for k in range(columns):
+        for p, row in enumerate(rows):
+            if row[k]:
+                break
+        else:
+            if stop:
+                return None
+            continue
+        if p:
+            rows[0], rows[p] = rows[p], rows[0]
+            sign = -sign
+        pivot_row = rows[0]
+        pivot = pivot_row[k]
+        tail = pivot_row[k + 1:]
+        rest = []
+        for row in rows[1:]:
+            f = row[k]
+            if f:
+                new = [(x*pivot - f*y) // previous for x, y in zip(row[k + 1:], tail)]
+            elif previous == pivot:
+                new = row[k + 1:]
+            else:
+                new = [x*pivot // previous for x in row[k + 1:]]
+            # Keeps the columns before k + 1 (all zero from now on) so that indices don't change
+            rest.append(row[:k + 1] + new)
+        pivots.append(pivot_row)
+        pivot_columns.append(k)
+        previous = pivot
+        rows = rest
+    return pivots, sign, pivot_columns
+
+# Back-substitution on the pivot rows of a non-singular n by n system with m right hand sides
+# Returns the numerators of the solution, over the common denominator d (the last pivot)
+# With d = det, y = d*x is an integer vector (by Cramer's rule), and every division is exact
+def _back_substitute(pivots, n, m):
+    d = pivots[-1][n - 1]
+    solutions = []
+    for c in range(n, n + m):
+        y = [0] * n
+        for i in range(n - 1, -1, -1):
+            row = pivots[i]
+            total = d * row[c]
+            for j in range(i + 1, n):
+                total -= row[j] * y[j]
+            y[i] = total // row[i]
+        solutions.append(y)
+    return solutions, d
+
+
+# Modular elimination and p-adic lifting
+
+# A random prime of _PRIME_BITS bits
+def _random_prime():
+    while True:
+        p = _random.getrandbits(_PRIME_BITS) | (1 << (_PRIME_BITS - 1)) | 1
+        if _is_prime(p):
+            return p
+
+# Rows and columns of small ints are packed into one large int each, 'width' bits apart
+# (width is a multiple of 8), so that a scalar times a whole row is one int operation
+# Signed values must be less than 2**(width - 1) in absolute value. Adding the offset
+# (half the range in every slot) makes every slot non-negative, so that packing and
+# unpacking goes through bytes
+@functools.lru_cache(maxsize=16)
+def _offset(count, width):
+    return int.from_bytes((1 << (width - 1)).to_bytes(width // 8, 'little') * count, 'little')
+
+def _pack(values, width, signed=False):
+    size = width // 8
+    if not signed:
+        return int.from_bytes(b''.join([v.to_bytes(size, 'little') for v in values]), 'little')
+    half = 1 << (width - 1)
+    packed = int.from_bytes(b''.join([(v + half).to_bytes(size, 'little') for v in values]), 'little')
+    return packed - _offset(len(values), width)
+
+def _unpack(packed, count, width, signed=False):
+    size = width // 8
+    from_bytes = int.from_bytes
+    if not signed:
+        data = packed.to_bytes(size * count, 'little')
+        return [from_bytes(data[i:i + size], 'little') for i in range(0, size * count, size)]
+    half = 1 << (width - 1)
+    data = (packed + _offset(count, width)).to_bytes(size * count, 'little')
+    return [from_bytes(data[i:i + size], 'little') - half for i in range(0, size * count, size)]
+
+# Gaussian elimination modulo the prime p on the integer rows, over their first 'columns'
+# columns. Columns without a pivot are skipped. With 'jordan', every pivot is also cleared
+# from the pivot rows before it (Gauss-Jordan elimination)
+# Rows are packed, and f*y is added as (p - f)*y, so that every slot stays non-negative
+# and is only reduced when its row becomes a pivot. Each step adds less than p**2 to a slot,
+# which the width leaves room for. Once a column is done, it's shifted out of every row,
+# so that the current column is always the lowest slot
+# Returns the pivot rows after the last column (packed, scaled so that their pivot was 1),
+# the width of their slots and the determinant modulo p of the matrix of the pivot rows
+# and columns (0 if a column was skipped)
+def _eliminate_mod(rows, columns, p, jordan=False):
+    count = len(rows[0])
+    width = (2 * p.bit_length() + len(rows).bit_length() + 8) // 8 * 8
+    mask = (1 << width) - 1
+    remaining = [_pack([x % p for x in row], width) for row in rows]
+    pivots = []
+    det = 1
+    for k in range(columns):
+        for i, row in enumerate(remaining):
+            lead = (row & mask) % p
+            if lead:
+                break
+        else:
+            det = 0
+            remaining = [row >> width for row in remaining]
+            pivots = [row >> width for row in pivots]
+            continue
+        del remaining[i]
+        if i % 2:
+            det = -det
+        det = det * lead % p
+        inverse = pow(lead, -1, p)
+        pivot = _pack([x * inverse % p for x in _unpack(row >> width, count - k - 1, width)], width)
+        for group in (remaining, pivots) if jordan else (remaining,):
+            for i, row in enumerate(group):
+                f = (row & mask) % p
+                group[i] = (row >> width) + (p - f) * pivot if f else row >> width
+        pivots.append(pivot)
+    return pivots, width, det % p
+
+# The inverse of the square integer matrix 'rows' modulo the prime p, as its list of columns,
+# and its determinant modulo p. Returns None if the matrix is singular modulo p
+# The rows of the inverse of the transpose are the columns of the inverse, so the
+# transpose is eliminated (next to the identity matrix)
+def _inverse_mod(rows, p):
+    n = len(rows)
+    augmented = [list(column) + [0] * i + [1] + [0] * (n - i - 1) for i, column in enumerate(zip(*rows))]
+    pivots, width, det = _eliminate_mod(augmented, n, p, True)
+    if not det:
+        return None
+    return [[x % p for x in _unpack(pivot, n, width)] for pivot in pivots], det
+
+# Solves a x = b modulo p**steps (Dixon's method), for the integer rows of a and b and the
+# columns of the inverse of a modulo p. For each column of b, each step finds the next
+# base p digit x_i of the solution as the inverse times r_i modulo p, and goes on with
+# r_i+1 = (r_i - a x_i) / p, which is exact. Returns the columns of x, as residues
+# The inverse and a are packed by columns, so that a matrix times a vector is n int
+# multiplications, and r is kept packed
+def _lift(a, b, inverse, p, steps):
+    n = len(a)
+    # r stays below max|b| + n * max|a| * p, and so does r - a x. It's only reduced modulo p
+    # before its product with the inverse if it can be larger than p. That product adds up
+    # n products of a value below p and an entry of r
+    largest = max(max(map(abs, row)) for row in a)
+    first = max(max(map(abs, row)) for row in b)
+    bits = max(first.bit_length(), largest.bit_length() + p.bit_length())
+    width = (bits + n.bit_length() + 9) // 8 * 8
+    reduce = max(first, n * largest).bit_length() >= p.bit_length()
+    bits = p.bit_length() + min(max(first, n * largest).bit_length(), p.bit_length())
+    inverse_width = (bits + n.bit_length() + 9) // 8 * 8
+    inverse = [_pack(column, inverse_width) for column in inverse]
+    a = [_pack(column, width, True) for column in zip(*a)]
+    solutions = []
+    for c in range(len(b[0])):
+        r = [row[c] for row in b]
+        residue = _pack(r, width, True)
+        digits = []
+        for _ in range(steps):
+            if reduce:
+                r = [v % p for v in r]
+            x = [v % p for v in _unpack(sum(map(mul, r, inverse)), n, inverse_width, True)]
+            residue = (residue - sum(map(mul, x, a))) // p
+            r = _unpack(residue, n, width, True)
+            digits.append(x)
+        x = [0] * n
+        for digit in reversed(digits):
+            x = [v*p + d for v, d in zip(x, digit)]
+        solutions.append(x)
+    return solutions
+
+# The fraction n/d with |n| and d at most 'bound' that is congruent to u modulo 'modulus',
+# as (n, d). It's unique if 2 * bound**2 < modulus
+def _rational_reconstruction(u, modulus, bound):
+    r0, r1 = modulus, u % modulus
+    t0, t1 = 0, 1
+    while r1 > bound:
+        q = r0 // r1
+        r0, r1 = r1, r0 - q*r1
+        t0, t1 = t1, t0 - q*t1
+    if t1 < 0:
+        return -r1, -t1
+    return r1, t1
+
+# Recovers fractions from their residues modulo 'modulus', given that their numerators and
+# denominators are all at most isqrt(modulus // 2). Returns the numerators over a common
+# denominator d, and d. Once d is known, most values are just u*d, reduced to the symmetric
+# range, so that the extended Euclidean algorithm only runs for the first few of them
+def _reconstruct(values, modulus):
+    bound = math.isqrt(modulus // 2)
+    half = modulus // 2
+    d = 1
+    pairs = []
+    for u in values:
+        r = u * d % modulus
+        if r > half:
+            r -= modulus
+        if -bound <= r <= bound:
+            pairs.append((r, d))
+        else:
+            r, e = _rational_reconstruction(u, modulus, bound)
+            d = d * (e // math.gcd(d, e))
+            pairs.append((r, e))
+    return [r * (d // e) for r, e in pairs], d
+
+# Hadamard's bound for the rows of a with the rows of b appended, as a number of bits:
+# the determinant of a, and every determinant of a with a column replaced by a column of b,
+# is less than 2**(bits / 2)
+def _hadamard_bits(a, b):
+    product = 1
+    for i, row in enumerate(a):
+        extra = max(x*x for x in b[i]) if b else 0
+        product *= sum(x*x for x in row) + extra
+    return product.bit_length()
+
+# Inverts the square integer matrix 'rows' modulo a random prime, trying a second prime
+# if the first one divides the determinant. Returns (inverse, det, p), or None if the
+# matrix is singular modulo both (it's then very likely singular)
+def _factor(rows):
+    for _ in range(2):
+        p = _random_prime()
+        result = _inverse_mod(rows, p)
+        if result is not None:
+            return *result, p
+    return None
+
+# Solves a x = b for the integer rows of a and b, given the inverse of a modulo p, and
+# returns the columns of the solution as integer numerators over a common denominator
+# If the determinant d of a is given, the numerators of d x are integers (Cramer's rule),
+# so they're found directly, after half as many steps
+def _modular_solve(a, b, inverse, p, d=None):
+    # Numerators and denominators are below 2**(bits / 2). Without d, they must be at most
+    # isqrt(p**steps // 2) for the reconstruction to be unique
+    bits = _hadamard_bits(a, b)
+    bits = bits // 2 + 2 if d else bits + 4
+    steps = bits // (p.bit_length() - 1) + 1
+    solutions = _lift(a, b, inverse, p, steps)
+    modulus = p**steps
+    if d:
+        half = modulus // 2
+        solutions = [[u * d % modulus for u in x] for x in solutions]
+        return [[y - modulus if y > half else y for y in x] for x in solutions], d
+    n = len(a)
+    numerators, d = _reconstruct([u for x in solutions for u in x], modulus)
+    return [numerators[c*n:(c + 1)*n] for c in range(len(solutions))], d
+
+# The determinant of the square integer matrix 'rows', given its inverse and determinant
+# modulo p. The common denominator s of the solution of a x = b, for a random b, divides
+# the determinant, and usually makes up most of it. The cofactor det / s is found modulo
+# p, and modulo more primes until their product is more than twice the bound Hadamard's
+# bound gives for it
+def _modular_det(rows, inverse, det, p):
+    b = [[_random.getrandbits(16)] for _ in rows]
+    _, s = _modular_solve(rows, b, inverse, p)
+    bits = (_hadamard_bits(rows, None) + 1) // 2 + 2 - (s.bit_length() - 1)
+    residue = det * pow(s, -1, p) % p
+    modulus = p
+    while modulus.bit_length() - 1 <= bits:
+        q = _random_prime()
+        if s % q == 0:
+            continue
+        cofactor = _eliminate_mod(rows, len(rows), q)[2] * pow(s, -1, q) % q
+        # Chinese remainder theorem
+        residue += modulus * ((cofactor - residue) * pow(modulus, -1, q) % q)
+        modulus *= q
+    if residue > modulus // 2:
+        residue -= modulus
+    return s * residue
+
+
+def det(a):
+    rows, scales = _integer_rows(a)
+    n = _square(rows)
+    if n == 0:
+        return frac(1)
+    if n >= _MODULAR_SIZE:
+        factored = _factor(rows)
+        if factored is not None:
+            return frac.from_ints(_modular_det(rows, *factored), math.prod(scales))
+    result = _bareiss(rows, n, True)
+    if result is None:
+        return frac(0)
+    pivots, sign, _ = result
+    return frac.from_ints(sign * pivots[-1][n - 1], math.prod(scales))
+
+# Solves a x = b for the rows of a and b (lists), returning the columns of the solution
+# as integer numerators over a common denominator, or None if a is singular
+def _solve(a, b):
+    if len(b) != len(a):
+        raise FractionError(f"The matrix has {len(a)} rows, but the right hand side has {len(b)}")
+    n = _square(a)
+    if n == 0:
+        return [], 1
+    rows, _ = _integer_rows(a, b)
+    if n >= _MODULAR_SIZE and b[0]:
+        left = [row[:n] for row in rows]
+        factored = _factor(left)
+        if factored is not None:
+            inverse, _, p = factored
+            # With many right hand sides, finding the determinant first pays for itself
+            d = _modular_det(left, *factored) if len(b[0]) >= _DETERMINANT_FIRST else None
+            return _modular_solve(left, [row[n:] for row in rows], inverse, p, d)
+    result = _bareiss(rows, n, True)
+    if result is None:
+        return None
+    return _back_substitute(result[0], n, len(b[0]))
+
+def solve(a, b):
+    a = [list(row) for row in a]
+    vector = len(b) == 0 or not isinstance(b[0], (list, tuple))
+    b = [[x] for x in b] if vector else [list(row) for row in b]
+    result = _solve(a, b)
+    if result is None:
+        raise FractionError("The matrix is singular")
+    solutions, d = result
+    from_ints = frac.from_ints
+    if vector:
+        return [from_ints(y, d) for y in solutions[0]] if solutions else []
+    return [[from_ints(column[i], d) for column in solutions] for i in range(len(a))]
+
+def inverse(a):
+    a = [list(row) for row in a]
+    n = len(a)
+    result = _solve(a, [[1 if i == j else 0 for j in range(n)] for i in range(n)])
+    if result is None:
+        raise FractionError("The matrix is singular, and has no inverse")
+    solutions, d = result
+    from_ints = frac.from_ints
+    return [[from_ints(column[i], d) for column in solutions] for i in range(n)]
+
+def rank(a):
+    rows, _ = _integer_rows(a)
+    if not rows:
+        return 0
+    columns = len(rows[0])
+    for row in rows:
+        if len(row) != columns:
+            raise FractionError("All the rows must have the same length")
+    # The rank modulo a prime is a lower bound, so it's exact when it's full
+    full = min(len(rows), columns)
+    if full >= _MODULAR_SIZE and len(_eliminate_mod(rows, columns, _random_prime())[0]) == full:
+        return full
+    return len(_bareiss(rows, columns, False)[0])
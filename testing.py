@@ -1,4 +1,5 @@
 from frac import *
+import ctypes
 
 x = frac('0.1_6...', '6')
 print(x)
@@ -14,4 +15,6 @@ print(x + 1)
 print(x > frac(1, 37))
 print(0.5*x <= 0.1)
 print()
-print(frac(1, 6) == '0.1_6...')
+print(frac(1, 6) == frac('0.1_6...'))
+print(frac.from_floats((ctypes.c_double * 3)(0.5, 0.25, 1.5)))
+print(frac(2).pow(frac(501, 2), 10))